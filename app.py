@@ -1,139 +1,99 @@
 import os
-import gradio as gr
-from checklist_data import CHECKLISTS
-from process_detection import detect_process_type
-from detectors import check_jurisdiction, check_missing_signatory
-from rag_index import RagIndex
-from sentence_transformers import SentenceTransformer
-from docx_utils import annotate_and_save
-
-# Load RAG index
-RAG = RagIndex()
-EMBED_MODEL = None
-if os.path.exists("adgm_index_data.pkl"):
+from jobs import JobQueue, QueueFull
+from metrics import METRICS, serve_metrics
+from review import start_warmup
+
+# Reviews run as background jobs; at most REVIEW_JOB_CONCURRENCY at once and
+# REVIEW_JOB_MAX_PENDING queued or running before new submissions are refused
+JOBS = JobQueue(max_concurrent=int(os.environ.get("REVIEW_JOB_CONCURRENCY", "2")),
+                max_pending=int(os.environ.get("REVIEW_JOB_MAX_PENDING", "8")))
+# Prometheus-style stage timings and counters at http://<host>:METRICS_PORT/metrics; 0 disables
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+METRICS.register_gauge("review_jobs_running", lambda: JOBS.stats()["running"], help="Review jobs running.")
+METRICS.register_gauge("review_jobs_queued", lambda: JOBS.stats()["queued"], help="Review jobs waiting to run.")
+
+def review_interface(files, process_choice, profile=False):
+    """Submit a review job and stream its per-file progress until it finishes."""
+    if not files:
+        yield {"error": "Upload at least one .docx file."}, "", None
+        return
     try:
-        RAG.load_from_pickle("adgm_index_data.pkl")
-    except Exception as e:
-        print("Failed to load index:", e)
-else:
-    print("No RAG index found — citations will be 'Pending'.")
-
-def ensure_embed_model():
-    global EMBED_MODEL
-    if EMBED_MODEL is None:
-        EMBED_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
-    return EMBED_MODEL
-
-def process_docs(files, selected_process):
-    all_issues = []
-    file_paths = [file.name if hasattr(file, "name") else file for file in files]
-
-    # Detect or use selected process type
-    process_type = None
-    if selected_process == "Auto Detect":
-        process_type = detect_process_type(file_paths)
-    else:
-        process_type = selected_process.lower().replace(" ", "_")
-
-    checklist_summary = {}
-    if process_type and process_type in CHECKLISTS:
-        required_docs = CHECKLISTS[process_type]
-        uploaded_names = [os.path.basename(p).lower() for p in file_paths]
-
-        # Find missing documents
-        missing_docs = []
-        for req in required_docs:
-            if not any(req.lower() in name for name in uploaded_names):
-                missing_docs.append(req)
-
-        checklist_summary = {
-            "process": process_type.replace("_", " ").title(),
-            "documents_uploaded": len(file_paths),
-            "total_required": len(required_docs),
-            "uploaded_count": len(required_docs) - len(missing_docs),
-            "missing_count": len(missing_docs),
-            "missing_docs": missing_docs
-        }
-
-        # Add missing doc warning to issues
-        if missing_docs:
-            all_issues.append({
-                "document": None,
-                "para_index": None,
-                "match_text": "",
-                "issue_text": f"Missing required documents for {process_type.replace('_', ' ').title()}",
-                "severity": "High",
-                "suggestion": f"Upload the missing documents: {', '.join(missing_docs)}",
-                "citation": "Checklist reference — ADGM requirements"
-            })
-
-    # Run red flag checks for each doc
-    for file_path in file_paths:
-        issues = []
-        issues.extend(check_jurisdiction(file_path))
-        issues.extend(check_missing_signatory(file_path))
-
-        # Add citations via RAG
-        for iss in issues:
-            q = iss.get("match_text", "")
-            if q and RAG.index is not None:
-                try:
-                    model = ensure_embed_model()
-                    vec = model.encode([q], convert_to_numpy=True)[0]
-                    results = RAG.query(vec, k=2)
-                    if results:
-                        top = results[0]
-                        iss["citation"] = (
-                            f"Source: {top['metadata']['url']} | "
-                            f"Excerpt: {top['chunk'][:300]} (dist={top['distance']:.3f})"
-                        )
-                except Exception as e:
-                    iss["citation"] = f"Citation lookup failed: {e}"
-            else:
-                iss["citation"] = iss.get("citation") or "Pending — no local index loaded"
-
-            iss["document"] = os.path.basename(file_path)
-
-        # Save annotated docx
-        out_path = f"{os.path.splitext(file_path)[0]}_reviewed.docx"
-        annotate_and_save(file_path, issues, out_path)
-
-        all_issues.extend(issues)
-
-    return checklist_summary, all_issues
-
-def review_interface(files, process_choice):
-    checklist, issues = process_docs(files, process_choice)
-    return [
-        {"process": checklist.get("process"),
-         "documents_uploaded": checklist.get("documents_uploaded"),
-         "issues_found": issues},
-        files[0].name.replace(".docx", "_reviewed.docx")
-    ]
-
-# Gradio UI
-with gr.Blocks() as demo:
-    gr.Markdown("## ADGM Corporate Agent — Demo")
-
-    with gr.Row():
-        uploaded_files = gr.File(label="Upload .docx files", file_types=[".docx"], file_count="multiple", type="filepath")
-
-    process_dropdown = gr.Dropdown(
-        choices=["Auto Detect", "Company Incorporation", "Licensing", "NDA"],
-        value="Auto Detect",
-        label="Process (auto-detect possible)"
-    )
-
-    review_btn = gr.Button("Review Documents")
-
-    json_output = gr.JSON(label="JSON Report")
-    download_output = gr.File(label="Download reviewed .docx")
-
-    review_btn.click(
-        fn=review_interface,
-        inputs=[uploaded_files, process_dropdown],
-        outputs=[json_output, download_output]
-    )
+        job = JOBS.submit(files, process_choice, profile=profile)
+    except QueueFull as e:
+        yield {"error": str(e), "queue": JOBS.stats()}, "", None
+        return
+
+    seen = 0
+    while not job.done:
+        yield job.progress(), job.id, None
+        seen = job.wait_for_update(seen, timeout=1.0)
+    yield job.result(), job.id, job.reviewed_files or None
+
+def fetch_job(job_id):
+    """Return the report and reviewed files of a job by id."""
+    job = JOBS.get((job_id or "").strip())
+    if job is None:
+        return {"error": f"Unknown job id: {job_id}"}, None
+    return job.result(), (job.reviewed_files or None) if job.done else None
+
+def build_demo():
+    """Build the Gradio UI; gradio is imported here so importing app stays cheap."""
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("## ADGM Corporate Agent — Demo")
+
+        with gr.Row():
+            uploaded_files = gr.File(label="Upload .docx files", file_types=[".docx"], file_count="multiple", type="filepath")
+
+        process_dropdown = gr.Dropdown(
+            choices=["Auto Detect", "Company Incorporation", "Licensing", "NDA"],
+            value="Auto Detect",
+            label="Process (auto-detect possible)"
+        )
+
+        profile_box = gr.Checkbox(label="Profile this review", value=False)
+        review_btn = gr.Button("Review Documents")
+
+        with gr.Row():
+            job_id_box = gr.Textbox(label="Job ID")
+            fetch_btn = gr.Button("Fetch results")
+
+        json_output = gr.JSON(label="JSON Report")
+        download_output = gr.File(label="Download reviewed .docx", file_count="multiple")
+
+        review_btn.click(
+            fn=review_interface,
+            inputs=[uploaded_files, process_dropdown, profile_box],
+            outputs=[json_output, job_id_box, download_output]
+        )
+        fetch_btn.click(
+            fn=fetch_job,
+            inputs=[job_id_box],
+            outputs=[json_output, download_output]
+        )
+
+    # Generator handlers need Gradio's queue to stream their updates
+    demo.queue()
+    return demo
+
+_DEMO = None
+
+def __getattr__(name):
+    # `app.demo` (e.g. for `gradio app.py` reload mode) builds the UI on first access
+    global _DEMO
+    if name == "demo":
+        if _DEMO is None:
+            _DEMO = build_demo()
+        return _DEMO
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    demo.launch()
+    demo = build_demo()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    demo.launch(prevent_thread_lock=True)
+    # The index and model load once the UI is already serving; reviews
+    # submitted meanwhile wait for them at the citation stage
+    start_warmup()
+    demo.block_thread()
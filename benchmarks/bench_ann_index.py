@@ -0,0 +1,98 @@
+# bench_ann_index.py
+# Recall-vs-latency benchmark for the ANN index types in rag_index.INDEX_TYPES.
+# Usage:
+#   python benchmarks/bench_ann_index.py --sizes 10000,100000,1000000 --k 2
+#   python benchmarks/bench_ann_index.py --sizes 10000 --types hnsw --ef-search 32,64,128
+
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_index import INDEX_TYPES, build_faiss_index, apply_search_params
+
+
+def synthetic_corpus(n, dim, n_clusters=256, seed=0):
+    """Clustered unit vectors, closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    x = centers[rng.integers(0, n_clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def synthetic_queries(corpus, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    q = corpus[rng.integers(0, len(corpus), n_queries)]
+    q = q + 0.05 * rng.standard_normal(q.shape).astype("float32")
+    return np.ascontiguousarray(q / np.linalg.norm(q, axis=1, keepdims=True), dtype="float32")
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def time_queries(index, queries, k):
+    """Single-row searches, matching how a citation lookup hits the index."""
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q.reshape(1, -1), k)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated corpus sizes")
+    ap.add_argument("--dim", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2 is 384)")
+    ap.add_argument("--k", type=int, default=2)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--types", default="hnsw,ivf", help="ANN types to compare against flat")
+    ap.add_argument("--ef-search", default="64", help="Comma-separated HNSW efSearch values")
+    ap.add_argument("--nprobe", default="16", help="Comma-separated IVF nprobe values")
+    ap.add_argument("--nlist", type=int, help="IVF nlist (default ~4*sqrt(n))")
+    ap.add_argument("--out", help="Write results as JSON to this file")
+    args = ap.parse_args()
+
+    results = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        corpus = synthetic_corpus(n, args.dim)
+        queries = synthetic_queries(corpus, args.queries)
+
+        flat, _ = build_faiss_index(corpus, "flat")
+        _, truth = flat.search(queries, args.k)
+        p50, p99 = time_queries(flat, queries, args.k)
+        results.append({"n": n, "type": "flat", "params": {}, "build_s": 0.0,
+                        "recall": 1.0, "p50_ms": p50, "p99_ms": p99})
+        print(f"n={n:>8} flat                         recall@{args.k}=1.000 p50={p50:.3f}ms p99={p99:.3f}ms")
+        del flat
+
+        for index_type in args.types.split(","):
+            if index_type not in INDEX_TYPES or index_type == "flat":
+                continue
+            t0 = time.perf_counter()
+            nlist = args.nlist or int(4 * np.sqrt(n))
+            index, params = build_faiss_index(corpus, index_type, nlist=nlist)
+            build_s = time.perf_counter() - t0
+            knob, values = ("efSearch", args.ef_search) if index_type == "hnsw" else ("nprobe", args.nprobe)
+            for v in [int(s) for s in values.split(",")]:
+                params = {**params, knob: v}
+                apply_search_params(index, params)
+                _, found = index.search(queries, args.k)
+                recall = recall_at_k(found, truth)
+                p50, p99 = time_queries(index, queries, args.k)
+                results.append({"n": n, "type": index_type, "params": params, "build_s": build_s,
+                                "recall": recall, "p50_ms": p50, "p99_ms": p99})
+                print(f"n={n:>8} {index_type:<5} {knob}={v:<6} build={build_s:7.1f}s "
+                      f"recall@{args.k}={recall:.3f} p50={p50:.3f}ms p99={p99:.3f}ms")
+            del index
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
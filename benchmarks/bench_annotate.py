@@ -0,0 +1,81 @@
+# bench_annotate.py
+# Shows annotate_and_save scaling with the number of issues on a large document.
+# The python-docx parse and the save are fixed costs timed on their own; the
+# per-issue work (resolve, highlight, appendix) is timed apart from them, and
+# its slope over the issue counts is the cost of one more issue.
+# Usage:
+#   python benchmarks/bench_annotate.py --paragraphs 5000 --issues 100,200,400,800,1600
+
+import argparse, json, os, sys, tempfile, time
+from docx import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from docx_utils import ReviewDocument, annotate_document, resolve_issue_paragraphs
+
+
+def make_document(path, n_paragraphs):
+    doc = Document()
+    for i in range(n_paragraphs):
+        doc.add_paragraph(f"Clause {i}. The parties agree to the terms set out in schedule {i % 17}.")
+    doc.save(path)
+
+
+def make_issues(texts, n_issues):
+    step = max(1, len(texts) // n_issues)
+    return [{"para_index": i, "match_text": texts[i], "issue_text": "Synthetic finding",
+             "severity": "Medium", "suggestion": "", "citation": ""}
+            for i in range(0, len(texts), step)][:n_issues]
+
+
+def slope(xs, ys):
+    """Least-squares (slope, intercept) of ys against xs."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    b = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var else 0.0
+    return b, my - b * mx
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--paragraphs", type=int, default=5000)
+    ap.add_argument("--issues", default="100,200,400,800,1600", help="Comma-separated issue counts")
+    ap.add_argument("--out", help="Write results as JSON to this file")
+    args = ap.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "large.docx")
+        make_document(src, args.paragraphs)
+        for n in [int(s) for s in args.issues.split(",")]:
+            doc = ReviewDocument(src)
+            issues = make_issues(doc.texts, n)
+            t0 = time.perf_counter()
+            doc.paragraphs  # the lazy python-docx parse
+            t1 = time.perf_counter()
+            resolve_issue_paragraphs(doc, issues)
+            t2 = time.perf_counter()
+            # Resolves again, then highlights, anchors and writes the appendix
+            annotated = annotate_document(doc, issues)
+            t3 = time.perf_counter()
+            annotated.save(os.path.join(tmp, "reviewed.docx"))
+            t4 = time.perf_counter()
+            row = {"paragraphs": args.paragraphs, "issues": len(issues), "parse_s": t1 - t0,
+                   "resolve_s": t2 - t1, "annotate_s": t3 - t2, "save_s": t4 - t3}
+            results.append(row)
+            print(f"paragraphs={args.paragraphs} issues={row['issues']:>5} parse={row['parse_s']:6.3f}s "
+                  f"resolve={row['resolve_s']:7.4f}s annotate={row['annotate_s']:6.3f}s "
+                  f"({row['annotate_s'] * 1000.0 / row['issues']:.3f} ms/issue) save={row['save_s']:6.3f}s")
+
+    if len(results) > 1:
+        per_issue, fixed = slope([r["issues"] for r in results], [r["annotate_s"] for r in results])
+        print(f"annotate: {per_issue * 1000.0:.3f} ms per additional issue, {fixed:.3f}s fixed")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
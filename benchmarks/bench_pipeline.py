@@ -0,0 +1,195 @@
+# bench_pipeline.py
+# End-to-end throughput and memory of the review stages on synthetic packs
+# (see synth_docs.py): extract_paragraphs, the detectors, citation lookup
+# against a synthetic index (dense-only, then hybrid with the BM25 fast path),
+# annotate_and_save and add_comments_to_docx.
+# Citation vectors come from a feature-hashing encoder standing in for the
+# SentenceTransformer, so no model download is needed. peak_mb is the Python
+# heap peak (tracemalloc), which misses lxml's C allocations; max_rss_mb is the
+# process high-water mark after the stage (POSIX only).
+# Usage:
+#   python benchmarks/bench_pipeline.py --paragraphs 200,1000 --out bench.json
+#   python benchmarks/bench_pipeline.py --paragraphs 200,1000 --baseline bench.json --tolerance 0.2
+
+import argparse, json, os, platform, statistics, sys, tempfile, time, tracemalloc, zlib
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from docx_utils import ReviewDocument, annotate_and_save, extract_paragraphs
+from detectors import run_rules
+from docx_comments import add_comments_to_docx
+from rag_index import RagIndex, build_faiss_index, write_native_index
+from lexical_index import LexicalIndex
+from synth_docs import ADGM_LAW, OBJECTS, OTHER_LAW, QUALIFIERS, SUBJECTS, VERBS, make_pack
+
+STAGES = ("extract_paragraphs", "detectors", "citation", "citation_hybrid", "annotate_and_save",
+          "add_comments_to_docx")
+
+
+class HashingEncoder:
+    """Bag-of-words feature hashing into unit vectors; deterministic and dependency-free."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for tok in text.lower().split():
+                out[row, zlib.crc32(tok.encode("utf-8")) % self.dim] += 1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+        return out
+
+
+def synthetic_index(out_dir, encoder, n_chunks, seed=0):
+    """
+    Regulation-like chunks embedded with the encoder, written in the native
+    layout with a BM25 index. Every 50th chunk quotes a governing-law clause,
+    so some flagged clauses can take the lexical fast path.
+    """
+    rng = np.random.default_rng(seed)
+    pick = lambda words: words[rng.integers(len(words))]
+    chunks = [f"Rule {i}: {pick(SUBJECTS)} {pick(VERBS)} {pick(OBJECTS)} {pick(QUALIFIERS)}."
+              + (f" Model clause: {pick(ADGM_LAW + OTHER_LAW)}" if i % 50 == 0 else "")
+              for i in range(n_chunks)]
+    vectors = encoder.encode(chunks)
+    index, params = build_faiss_index(vectors, "flat")
+    metadata = [{"url": f"https://example.adgm/rules/{i // 20}", "chunk_index": i % 20} for i in range(n_chunks)]
+    write_native_index(out_dir, index, chunks, metadata, encoder.dim, model="hashing",
+                       index_version="synthetic", index_params=params)
+    LexicalIndex.build(chunks).save(out_dir)
+    rag = RagIndex()
+    rag.load(out_dir)
+    return rag
+
+
+def run_stage(stage, paths, state, encoder, rag, out_dir):
+    """Run one stage over every file of the pack; returns the number of items processed."""
+    items = 0
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if stage == "extract_paragraphs":
+            state[path] = {"texts": extract_paragraphs(path)}
+            items += len(state[path]["texts"])
+        elif stage == "detectors":
+            state[path]["issues"] = run_rules(state[path]["texts"])
+            items += len(state[path]["texts"])
+        elif stage == "citation":
+            texts = list(dict.fromkeys(i["match_text"] for i in state[path]["issues"] if i["match_text"]))
+            if texts:
+                rag.query_batch(encoder.encode(texts), k=2)
+            items += len(texts)
+        elif stage == "citation_hybrid":
+            texts = list(dict.fromkeys(i["match_text"] for i in state[path]["issues"] if i["match_text"]))
+            if texts:
+                rag.query_texts(texts, encoder.encode, k=2, mode="hybrid")
+            items += len(texts)
+        elif stage == "annotate_and_save":
+            annotate_and_save(ReviewDocument(path), state[path]["issues"],
+                              os.path.join(out_dir, f"{name}_reviewed.docx"))
+            items += len(state[path]["issues"])
+        elif stage == "add_comments_to_docx":
+            comments = [{"para_index": i["para_index"], "text": i["issue_text"]} for i in state[path]["issues"]]
+            add_comments_to_docx(path, os.path.join(out_dir, f"{name}_comments.docx"), comments)
+            items += len(comments)
+    return items
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+
+
+def bench_pack(paths, encoder, rag, out_dir, repeat):
+    """Time each stage (best of `repeat`), then rerun it once under tracemalloc for peak memory."""
+    state = {}
+    rows = []
+    for stage in STAGES:
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            items = run_stage(stage, paths, state, encoder, rag, out_dir)
+            times.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        run_stage(stage, paths, state, encoder, rag, out_dir)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        best = min(times)
+        rows.append({"stage": stage, "files": len(paths), "items": items,
+                     "seconds": best, "median_seconds": statistics.median(times),
+                     "items_per_s": items / best if best else 0.0,
+                     "peak_mb": peak / 1e6, "max_rss_mb": max_rss_mb()})
+    return rows
+
+
+def compare(results, baseline_path, tolerance):
+    """Print stages slower than the baseline by more than tolerance; returns their count."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["process"], r["paragraphs"], r["stage"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        base = baseline.get((r["process"], r["paragraphs"], r["stage"]))
+        if base is None or not base["seconds"]:
+            continue
+        change = r["seconds"] / base["seconds"] - 1.0
+        if change > tolerance:
+            regressions += 1
+            print(f"REGRESSION {r['process']} paragraphs={r['paragraphs']} {r['stage']}: "
+                  f"{base['seconds']:.4f}s -> {r['seconds']:.4f}s ({change:+.0%})")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%} against {baseline_path}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--processes", default="company_incorporation", help="Comma-separated CHECKLISTS keys")
+    ap.add_argument("--paragraphs", default="200,1000", help="Comma-separated paragraph counts per document")
+    ap.add_argument("--table-density", type=float, default=0.1)
+    ap.add_argument("--non-adgm", type=float, default=0.3)
+    ap.add_argument("--missing-signatory", type=float, default=0.5)
+    ap.add_argument("--index-size", type=int, default=20000, help="Chunks in the synthetic citation index")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="Write results as JSON to this file")
+    ap.add_argument("--baseline", help="Earlier --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage is flagged")
+    args = ap.parse_args()
+
+    encoder = HashingEncoder()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = synthetic_index(os.path.join(tmp, "index"), encoder, args.index_size, args.seed)
+        for process in args.processes.split(","):
+            for n in [int(s) for s in args.paragraphs.split(",")]:
+                pack_dir = os.path.join(tmp, f"{process}_{n}")
+                paths = make_pack(pack_dir, process, n, args.table_density, args.non_adgm,
+                                  args.missing_signatory, args.seed)
+                for row in bench_pack(paths, encoder, rag, pack_dir, args.repeat):
+                    row.update(process=process, paragraphs=n)
+                    results.append(row)
+                    print(f"{process:<22} paragraphs={n:>6} {row['stage']:<21} {row['seconds']:8.4f}s "
+                          f"{row['items_per_s']:10.1f} items/s  peak={row['peak_mb']:7.1f} MB")
+        retrieval = rag.retrieval_stats()
+    print(f"Hybrid retrieval: fast path {retrieval['fast_path_rate']:.0%} of clauses, "
+          f"{retrieval['lexical']['mean_ms'] or 0:.3f} ms vs {retrieval['dense']['mean_ms'] or 0:.3f} ms "
+          f"per clause on the dense path")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)},
+                       "results": results, "retrieval": retrieval}, f, indent=2)
+        print(f"Saved results to {args.out}")
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
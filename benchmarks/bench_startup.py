@@ -0,0 +1,92 @@
+# bench_startup.py
+# Cold-start costs of the app, each measured in a fresh interpreter:
+#   import         `import app` (no UI, no index, no model)
+#   first_ui       launching app.py until the UI answers HTTP requests
+#   first_citation importing review until the first issue has its citation
+#                  (index load + model load + encode + search)
+# Usage:
+#   python benchmarks/bench_startup.py --repeat 3 --port 7861
+
+import argparse, json, os, statistics, subprocess, sys, time, urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import app
+print(time.perf_counter() - t0)
+"""
+
+CITATION_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import review
+review.start_warmup()
+issue = {"match_text": "This agreement is governed by the courts of Dubai.", "citation": ""}
+review.add_citations([issue])
+print(time.perf_counter() - t0)
+print(issue["citation"][:120])
+"""
+
+
+def run_snippet(snippet):
+    out = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stdout.strip().splitlines()
+    return float(out[0]), out[1:]
+
+
+def time_first_ui(port, timeout):
+    env = dict(os.environ, GRADIO_SERVER_PORT=str(port))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"app.py exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"UI not reachable after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--port", type=int, default=7861)
+    ap.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the UI")
+    ap.add_argument("--skip-ui", action="store_true", help="Skip the time-to-first-UI measurement")
+    ap.add_argument("--out", help="Write results as JSON to this file")
+    args = ap.parse_args()
+
+    samples = {"import": [], "first_ui": [], "first_citation": []}
+    citation = None
+    for _ in range(args.repeat):
+        samples["import"].append(run_snippet(IMPORT_SNIPPET)[0])
+        if not args.skip_ui:
+            samples["first_ui"].append(time_first_ui(args.port, args.timeout))
+        seconds, lines = run_snippet(CITATION_SNIPPET)
+        samples["first_citation"].append(seconds)
+        citation = lines[0] if lines else ""
+
+    results = {name: {"median_seconds": statistics.median(vals), "samples": vals}
+               for name, vals in samples.items() if vals}
+    for name, r in results.items():
+        print(f"{name:<15} median={r['median_seconds']:7.3f}s  samples={['%.3f' % v for v in r['samples']]}")
+    print(f"first citation: {citation}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
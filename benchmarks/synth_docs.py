@@ -0,0 +1,122 @@
+# synth_docs.py
+# Synthetic ADGM document packs for benchmarks: one .docx per CHECKLISTS entry
+# of a process, named after the checklist item so process detection and the
+# checklist match them, with clause paragraphs, tables, governing-law clauses
+# (a share of them naming a non-ADGM forum) and, unless left out, a signatory
+# block.
+# Usage:
+#   python benchmarks/synth_docs.py --out synth_packs --paragraphs 200 --table-density 0.1 \
+#       --non-adgm 0.3 --missing-signatory 0.5
+
+import argparse, os, random, sys
+from docx import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from checklist_data import CHECKLISTS
+
+PARTIES = ["Falcon Holdings Ltd", "Gulf Bridge Capital LLC", "Saadiyat Ventures Ltd",
+           "Reem Island Technologies Ltd", "Maryah Trading Ltd", "Corniche Partners LLP"]
+PEOPLE = ["Aisha Al Mansoori", "Omar Haddad", "Priya Nair", "James Whitfield",
+          "Fatima Al Suwaidi", "Chen Wei", "Layla Karim", "Daniel Okafor"]
+SUBJECTS = ["The Company", "Each Shareholder", "The Board of Directors", "The Licensee",
+            "The Receiving Party", "The Disclosing Party", "The Applicant", "Each Director"]
+VERBS = ["shall maintain", "shall deliver", "may appoint", "shall procure", "shall not disclose",
+         "shall promptly notify", "may request", "shall keep accurate records of"]
+OBJECTS = ["the register of members", "all Confidential Information", "the annual accounts",
+           "a registered office in Abu Dhabi", "any transfer of shares", "the business plan",
+           "the premises lease", "the incorporation documents", "written resolutions of the Board"]
+QUALIFIERS = ["within thirty (30) days of the Effective Date", "in accordance with the Companies Regulations 2020",
+              "subject to the prior written consent of the Registrar", "at its own cost and expense",
+              "save as otherwise provided in these Articles", "for the duration of the Term",
+              "to the extent permitted by applicable law", "without undue delay"]
+ADGM_LAW = ["This Agreement shall be governed by the laws of the Abu Dhabi Global Market and the ADGM Courts "
+            "shall have exclusive jurisdiction over any dispute arising out of it.",
+            "Any dispute shall be referred to the ADGM Courts, which shall have exclusive jurisdiction."]
+OTHER_LAW = ["This Agreement shall be governed by the laws of the Emirate of Dubai and the courts of Dubai "
+             "shall have exclusive jurisdiction.",
+             "The parties submit to the exclusive jurisdiction of the DIFC Courts.",
+             "Any dispute shall be settled by the federal courts of the United Arab Emirates, which shall have jurisdiction.",
+             "This Agreement is subject to English law and the jurisdiction of the courts of England and Wales."]
+
+
+def file_name(requirement):
+    """Checklist item -> file name the checklist matcher recognizes."""
+    return requirement.replace("/", "-") + ".docx"
+
+
+def clause(rng, n):
+    return (f"{n}. {rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} "
+            f"{rng.choice(QUALIFIERS)}.")
+
+
+def add_table(doc, rng):
+    rows = rng.randint(2, 6)
+    table = doc.add_table(rows=rows + 1, cols=3)
+    for cell, title in zip(table.rows[0].cells, ("Name", "Role", "Shares held")):
+        cell.text = title
+    for row in table.rows[1:]:
+        row.cells[0].text = rng.choice(PEOPLE)
+        row.cells[1].text = rng.choice(["Director", "Shareholder", "Secretary", "Authorised person"])
+        row.cells[2].text = str(rng.randint(1, 10000))
+
+
+def make_document(path, title, paragraphs=200, table_density=0.1, non_adgm=0.3,
+                  signatory=True, rng=None):
+    """
+    Write one synthetic document: a title, `paragraphs` body paragraphs of
+    numbered clauses, a table after each paragraph with probability
+    table_density, one governing-law clause per ~50 paragraphs (non-ADGM with
+    probability non_adgm) and a signatory block when signatory is true.
+    """
+    rng = rng or random.Random(0)
+    doc = Document()
+    doc.add_heading(title, level=1)
+    doc.add_paragraph(f"Between {rng.choice(PARTIES)} and {rng.choice(PARTIES)}.")
+    law_every = 50
+    for n in range(1, paragraphs + 1):
+        if n % law_every == 0 or (n == paragraphs and paragraphs < law_every):
+            doc.add_paragraph(f"{n}. " + rng.choice(OTHER_LAW if rng.random() < non_adgm else ADGM_LAW))
+        else:
+            doc.add_paragraph(clause(rng, n))
+        if rng.random() < table_density:
+            add_table(doc, rng)
+    if signatory:
+        doc.add_paragraph("IN WITNESS WHEREOF the parties have signed this document on the date first written above.")
+        for person in rng.sample(PEOPLE, 2):
+            doc.add_paragraph(f"Signature: ____________________  Name: {person}  Title: Director  Date: __________")
+    doc.save(path)
+
+
+def make_pack(out_dir, process, paragraphs=200, table_density=0.1, non_adgm=0.3,
+              missing_signatory=0.5, seed=0):
+    """Write one document per checklist item of `process`; returns their paths."""
+    rng = random.Random(f"{process}-{seed}")
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for requirement in CHECKLISTS[process]:
+        path = os.path.join(out_dir, file_name(requirement))
+        make_document(path, requirement, paragraphs, table_density, non_adgm,
+                      signatory=rng.random() >= missing_signatory, rng=rng)
+        paths.append(path)
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="synth_packs", help="One sub-directory per process is created here")
+    ap.add_argument("--processes", default=",".join(CHECKLISTS), help="Comma-separated CHECKLISTS keys")
+    ap.add_argument("--paragraphs", type=int, default=200, help="Body paragraphs per document")
+    ap.add_argument("--table-density", type=float, default=0.1, help="Chance of a table after each paragraph")
+    ap.add_argument("--non-adgm", type=float, default=0.3, help="Share of governing-law clauses naming another forum")
+    ap.add_argument("--missing-signatory", type=float, default=0.5, help="Share of documents without a signatory block")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    for process in args.processes.split(","):
+        paths = make_pack(os.path.join(args.out, process), process, args.paragraphs, args.table_density,
+                          args.non_adgm, args.missing_signatory, args.seed)
+        print(f"{process}: {len(paths)} documents in {os.path.join(args.out, process)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,404 @@
 # build_rag_sentence_transformers.py
 # Usage:
 #   pip install sentence-transformers faiss-cpu bs4 requests
-#   python build_rag_sentence_transformers.py --data-sources data_sources.txt --out adgm_index_data.pkl
+#   python build_rag_sentence_transformers.py --data-sources data_sources.txt --out adgm_index
+#   (add --format pickle --out adgm_index_data.pkl for the legacy single-file pickle)
+#
+# data_sources.txt lists one source per line: an http(s) URL, a local file
+# (.html/.htm/.txt/.md) or a directory of such files. Native builds keep a
+# manifest.json of per-source content hashes and chunk rows, so re-running
+# only re-embeds sources that changed or are new and drops removed ones.
 
-import argparse, pickle, requests
+import argparse, hashlib, json, os, pickle, requests, shutil, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from sentence_transformers import SentenceTransformer
 import numpy as np
-import faiss
+from rag_index import (INDEX_TYPES, NATIVE_FILES, QUANTIZERS, ChunkStore, NativeIndexWriter, RagIndex,
+                       build_faiss_index, compression_report)
+from lexical_index import LexicalIndex
+from metrics import collect, span
+from checklist_data import CHECKLISTS
+from doc_classifier import PROTOTYPES_FILE, Prototypes, prototypes_path
 
-def fetch_text(url):
+LOCAL_EXTENSIONS = (".html", ".htm", ".txt", ".md")
+MANIFEST = "manifest.json"
+BUILD_STATE = "build_state.json"
+
+class ResumeMismatch(Exception):
+    """A source changed since the interrupted build; its rows cannot be reused."""
+
+def html_to_text(html):
+    soup = BeautifulSoup(html, "html.parser")
+    for s in soup(['script', 'style', 'noscript']):
+        s.decompose()
+    return soup.get_text(separator="\n")
+
+def fetch_text(url, session=None):
     try:
-        r = requests.get(url, timeout=20)
+        r = (session or requests).get(url, timeout=20)
         r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        for s in soup(['script', 'style', 'noscript']):
-            s.decompose()
-        return soup.get_text(separator="\n")
+        return html_to_text(r.text)
     except Exception as e:
         print(f"Failed {url}: {e}")
         return ""
 
-def chunk_text(text, chunk_size=400, overlap=80):
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+def expand_sources(lines):
+    """URLs pass through; directories expand to the supported files inside them."""
+    sources = []
+    for line in lines:
+        if is_url(line) or os.path.isfile(line):
+            sources.append(line)
+        elif os.path.isdir(line):
+            for folder, _, files in sorted(os.walk(line)):
+                for name in sorted(files):
+                    if name.lower().endswith(LOCAL_EXTENSIONS):
+                        sources.append(os.path.join(folder, name))
+        else:
+            print(f"Skipping {line}: not a URL, file or directory")
+    return sources
+
+def fetch_source(source, session, previous=None):
+    """Fetch one source. Returns a doc dict; 'unchanged' is set when the
+    server answered 304 to a conditional GET built from the manifest entry.
+    """
+    previous = previous or {}
+    doc = {"url": source, "text": "", "hash": None, "etag": None,
+           "last_modified": None, "unchanged": False}
+    try:
+        if is_url(source):
+            headers = {}
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+            r = session.get(source, timeout=20, headers=headers)
+            if r.status_code == 304:
+                doc.update(unchanged=True, hash=previous.get("hash"),
+                           etag=previous.get("etag"), last_modified=previous.get("last_modified"))
+                return doc
+            r.raise_for_status()
+            doc["etag"] = r.headers.get("ETag")
+            doc["last_modified"] = r.headers.get("Last-Modified")
+            doc["text"] = html_to_text(r.text)
+        else:
+            with open(source, "r", encoding="utf-8", errors="replace") as f:
+                raw = f.read()
+            doc["text"] = html_to_text(raw) if source.lower().endswith((".html", ".htm")) else raw
+    except Exception as e:
+        print(f"Failed {source}: {e}")
+        return doc
+    doc["hash"] = hashlib.sha256(doc["text"].encode("utf-8")).hexdigest()
+    return doc
+
+def iter_documents(sources, manifest_docs, workers=8):
+    """Fetch sources concurrently over one pooled HTTP session and yield them
+    in source order, keeping at most 2 * workers pages in flight.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    it = iter(sources)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = deque(ex.submit(fetch_source, s, session, manifest_docs.get(s))
+                        for s in islice(it, 2 * workers))
+        while pending:
+            doc = pending.popleft().result()
+            for s in islice(it, 1):
+                pending.append(ex.submit(fetch_source, s, session, manifest_docs.get(s)))
+            yield doc
+
+def iter_chunks(text, chunk_size=400, overlap=80):
     words = text.split()
-    chunks = []
     for i in range(0, len(words), chunk_size - overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
+        yield " ".join(words[i:i + chunk_size])
+
+def iter_rows(docs, prev_docs, previous, manifest_docs, counts, expected=()):
+    """Yield (chunk, metadata, vector or None) in output order.
+
+    Unchanged sources replay their previous chunks and vectors; changed or new
+    ones are chunked lazily and yield None for the vector still to be encoded.
+    manifest_docs is filled in as rows are produced. `expected` lists the
+    (url, hash) pairs of an interrupted build; a mismatch raises ResumeMismatch.
+    """
+    row = 0
+    # Index into expected; sources that produce no rows are not listed there
+    emitted = 0
+    for doc in docs:
+        prev = prev_docs.get(doc["url"])
+        if prev is not None and (doc["unchanged"] or doc["hash"] == prev["hash"] or not doc["text"]):
+            start, end = prev["rows"]
+            entry = dict(prev)
+            rows = ((previous.chunks[i], previous.vectors[i]) for i in range(start, end))
+            counts["reused"] += 1
+        elif doc["text"]:
+            entry = {"hash": doc["hash"], "etag": doc["etag"], "last_modified": doc["last_modified"]}
+            rows = ((ch, None) for ch in iter_chunks(doc["text"]))
+            counts["embedded"] += 1
+        else:
+            continue
+        if emitted < len(expected) and list(expected[emitted]) != [doc["url"], entry["hash"]]:
+            raise ResumeMismatch(doc["url"])
+        emitted += 1
+        entry["rows"] = [row, row]
+        manifest_docs[doc["url"]] = entry
+        for ci, (ch, vec) in enumerate(rows):
+            entry["rows"][1] = row + 1
+            yield ch, {"url": doc["url"], "chunk_index": ci}, vec
+            row += 1
+
+def version_hasher(model_name):
+    """Content hash identifying a build, fed every chunk by update_version();
+    caches keyed on it go stale on rebuild."""
+    return hashlib.sha256(model_name.encode("utf-8"))
+
+def update_version(h, chunk):
+    h.update(chunk.encode("utf-8"))
+    h.update(b"\0")
+
+def load_build_state(tmp_out, model_name):
+    """State of an interrupted build in tmp_out, if it can be resumed."""
+    path = os.path.join(tmp_out, BUILD_STATE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return state if state.get("model") == model_name else None
+
+def save_build_state(tmp_out, state):
+    path = os.path.join(tmp_out, BUILD_STATE)
+    with open(path + ".new", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".new", path)
+
+def load_previous(out_dir, model_name):
+    """Return (manifest, RagIndex) of an earlier native build made with the
+    same model, or (None, None) when there is nothing reusable.
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != model_name:
+        print("Previous build used a different model; rebuilding from scratch.")
+        return None, None
+    previous = RagIndex()
+    previous.load(out_dir)
+    if previous.vectors is None:
+        return None, None
+    return manifest, previous
+
+def stream_build(args, sources, prev_docs, previous, tmp_out, state, get_model):
+    """Chunk -> encode -> append in fixed-size batches. Every batch is flushed
+    to the part files and recorded in build_state.json before the next one
+    starts, so peak memory is one batch and an interrupted run resumes from
+    the last completed batch. get_model() is called only when a batch has
+    chunks to encode. Returns (writer, manifest_docs, index_version).
+    """
+    state = state or {}
+    skip = state.get("rows", 0)
+    writer = NativeIndexWriter(tmp_out, rows=skip, dimension=state.get("dimension"), urls=state.get("urls"))
+    if skip:
+        print(f"Resuming after {skip} chunks already written.")
+
+    counts = {"reused": 0, "embedded": 0}
+    manifest_docs = {}
+    rows = iter_rows(iter_documents(sources, prev_docs, workers=args.workers),
+                     prev_docs, previous, manifest_docs, counts, expected=state.get("docs", ()))
+    h = version_hasher(args.model)
+    started = last_report = time.time()
+    done = text_bytes = 0
+
+    # Rows already written by the interrupted run only feed the version hash
+    for ch, _, _ in islice(rows, skip):
+        update_version(h, ch)
+
+    while True:
+        # Fetching and chunking happen lazily while the batch is drawn
+        with span("fetch_chunk"):
+            batch = list(islice(rows, args.batch_size))
+        if not batch:
+            break
+        texts = [ch for ch, _, _ in batch]
+        vecs = [vec for _, _, vec in batch]
+        todo = [i for i, vec in enumerate(vecs) if vec is None]
+        if todo:
+            model = get_model()
+            with span("encode"):
+                encoded = model.encode([texts[i] for i in todo], convert_to_numpy=True,
+                                       batch_size=min(args.batch_size, 64))
+            for i, vec in zip(todo, encoded):
+                vecs[i] = vec
+        for ch in texts:
+            update_version(h, ch)
+        with span("write"):
+            writer.append(texts, [md for _, md, _ in batch], np.asarray(vecs, dtype="float32"))
+            writer.flush()
+            save_build_state(tmp_out, {
+                "model": args.model, **writer.state(),
+                "docs": [[url, e["hash"]] for url, e in manifest_docs.items()],
+            })
+
+        done += len(batch)
+        text_bytes += sum(len(t.encode("utf-8")) for t in texts)
+        now = time.time()
+        if now - last_report >= 2 or len(batch) < args.batch_size:
+            elapsed = max(now - started, 1e-9)
+            print(f"  {writer.rows} chunks | {done / elapsed:.1f} chunks/s | "
+                  f"{text_bytes / elapsed / 1e6:.2f} MB/s")
+            last_report = now
+
+    removed = len(set(prev_docs) - set(manifest_docs))
+    print(f"Created {writer.rows} chunks: {counts['reused']} sources reused, "
+          f"{counts['embedded']} re-embedded, {removed} removed.")
+    return writer, manifest_docs, h.hexdigest()[:16]
+
+def print_timings(timings):
+    total = sum(t["seconds"] for t in timings.values()) or 1e-9
+    print("Stage timings:")
+    for stage, t in sorted(timings.items(), key=lambda kv: -kv[1]["seconds"]):
+        print(f"  {stage:<12} {t['seconds']:9.2f}s  {100 * t['seconds'] / total:5.1f}%  ({t['count']} calls)")
 
 def main():
+    with collect() as timings:
+        build(parse_args())
+    print_timings(timings.as_dict())
+
+def parse_args():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--data-sources", required=True, help="Text file with one URL per line")
-    ap.add_argument("--out", default="adgm_index_data.pkl", help="Output pickle file")
+    ap.add_argument("--data-sources", required=True,
+                    help="Text file with one URL, local file or directory per line")
+    ap.add_argument("--out", default="adgm_index", help="Output directory (native) or pickle file")
+    ap.add_argument("--format", choices=["native", "pickle"], default="native",
+                    help="native: mmap-friendly directory layout; pickle: legacy single file")
     ap.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer model")
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=8, help="Concurrent fetches")
+    ap.add_argument("--batch-size", type=int, default=256, help="Chunks encoded and written per batch")
+    ap.add_argument("--full", action="store_true",
+                    help="Ignore the manifest and any interrupted build; re-embed everything")
+    ap.add_argument("--index-type", choices=sorted(INDEX_TYPES), default="flat",
+                    help="flat: exact brute force; hnsw / ivf: approximate, faster on large corpora")
+    ap.add_argument("--hnsw-m", type=int, help="HNSW graph degree M (default 32)")
+    ap.add_argument("--ef-construction", type=int, help="HNSW efConstruction (default 80)")
+    ap.add_argument("--ef-search", type=int, help="HNSW efSearch (default 64)")
+    ap.add_argument("--nlist", type=int, help="IVF number of lists (default 1024)")
+    ap.add_argument("--nprobe", type=int, help="IVF lists probed per query (default 16)")
+    ap.add_argument("--quantizer", choices=sorted(QUANTIZERS), default="none",
+                    help="Compressed vector storage; full-precision vectors are kept for exact re-ranking")
+    ap.add_argument("--pq-m", type=int, help="PQ sub-quantizers, must divide the dimension (default 16)")
+    ap.add_argument("--rerank-k", type=int, help="Candidates re-ranked exactly per query (default 50)")
+    ap.add_argument("--no-lexical", action="store_true",
+                    help="Skip the BM25 index used for the lexical citation fast path")
+    return ap.parse_args()
 
-    # Read URLs
+def build(args):
+    # Read sources
     with open(args.data_sources, "r", encoding="utf-8") as f:
-        urls = [line.strip() for line in f if line.strip()]
+        sources = expand_sources([line.strip() for line in f if line.strip()])
 
-    print(f"Fetching {len(urls)} URLs...")
-    docs = []
-    for u in urls:
-        txt = fetch_text(u)
-        if txt:
-            docs.append({"url": u, "text": txt})
+    manifest, previous = None, None
+    if args.format == "native" and not args.full:
+        manifest, previous = load_previous(args.out, args.model)
+    prev_docs = manifest["documents"] if manifest else {}
 
-    # Chunking
-    chunks, metadata = [], []
-    for doc in docs:
-        for ci, ch in enumerate(chunk_text(doc["text"])):
-            chunks.append(ch)
-            metadata.append({"url": doc["url"], "chunk_index": ci, "excerpt": ch[:300]})
+    # Batches stream into a working directory next to the output; it is
+    # swapped into place once complete (the old build may still be mmapped)
+    tmp_out = args.out.rstrip("/\\") + ".tmp"
+    state = None if args.full else load_build_state(tmp_out, args.model)
+    if state is None and os.path.isdir(tmp_out):
+        shutil.rmtree(tmp_out)
 
-    print(f"Created {len(chunks)} chunks.")
+    # One model for the chunks and the checklist prototypes, loaded on first use
+    model = None
+
+    def get_model():
+        nonlocal model
+        if model is None:
+            with span("load_model"):
+                model = SentenceTransformer(args.model)
+        return model
+
+    print(f"Fetching {len(sources)} sources with {args.workers} workers...")
+    try:
+        writer, docs, version = stream_build(args, sources, prev_docs, previous, tmp_out, state, get_model)
+    except ResumeMismatch as e:
+        print(f"{e} changed since the interrupted build; starting over.")
+        shutil.rmtree(tmp_out)
+        writer, docs, version = stream_build(args, sources, prev_docs, previous, tmp_out, None, get_model)
 
-    # Embeddings
-    print("Encoding embeddings...")
-    model = SentenceTransformer(args.model)
-    embeddings = model.encode(chunks, convert_to_numpy=True, show_progress_bar=True)
+    # Build FAISS index from the memory-mapped vectors
+    vectors = writer.vectors()
+    dim = vectors.shape[1]
+    with span("index_build"):
+        index, index_params = build_faiss_index(
+            vectors, args.index_type, quantizer=args.quantizer,
+            M=args.hnsw_m, efConstruction=args.ef_construction, efSearch=args.ef_search,
+            nlist=args.nlist, nprobe=args.nprobe, pq_m=args.pq_m, rerank_k=args.rerank_k)
+    print(f"Built {index_params}")
+    compression = None
+    if args.quantizer != "none":
+        with span("compression"):
+            compression = compression_report(index, vectors, index_params)
+        print(f"Compression: {compression}")
+    del vectors
 
-    # Build FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype("float32"))
+    # Checklist prototypes for content-based document classification, stored
+    # with the index so the app does not embed them at startup
+    with span("prototypes"):
+        st = get_model()
+        protos = Prototypes.build(lambda texts: st.encode(texts, convert_to_numpy=True), CHECKLISTS, args.model)
+    model = st = None
 
     # Save
-    with open(args.out, "wb") as f:
-        pickle.dump({
-            "chunks": chunks,
-            "metadata": metadata,
-            "index_flat": index,
-            "dimension": dim
-        }, f)
+    with span("save"):
+        writer.finish(index, dimension=dim, model=args.model, index_version=version,
+                      index_params=index_params, compression=compression)
+        os.remove(os.path.join(tmp_out, BUILD_STATE))
+        # The BM25 index is rebuilt from every chunk; tokenizing is cheap next to encoding
+        lexical = None
+        if not args.no_lexical:
+            with span("lexical_index"):
+                lexical = LexicalIndex.build(ChunkStore(os.path.join(tmp_out, NATIVE_FILES["chunks"]),
+                                                        os.path.join(tmp_out, NATIVE_FILES["offsets"])))
+        if args.format == "native":
+            with open(os.path.join(tmp_out, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump({"model": args.model, "documents": docs}, f, indent=1)
+            protos.save(os.path.join(tmp_out, PROTOTYPES_FILE))
+            if lexical is not None:
+                lexical.save(tmp_out)
+            previous = None
+            if os.path.isdir(args.out):
+                shutil.rmtree(args.out)
+            os.replace(tmp_out, args.out)
+        else:
+            built = RagIndex()
+            built.load(tmp_out)
+            with open(args.out, "wb") as f:
+                pickle.dump({
+                    "chunks": [built.chunks[i] for i in range(len(built.chunks))],
+                    "metadata": [built.metadata[i] for i in range(len(built.metadata))],
+                    "index_flat": index,
+                    "dimension": dim,
+                    "model": args.model,
+                    "index_version": version,
+                    "index_params": index_params,
+                    "vectors": np.array(built.vectors) if args.quantizer != "none" else None,
+                    "compression": compression,
+                    "lexical": lexical.to_dict() if lexical is not None else None
+                }, f)
+            built = None
+            shutil.rmtree(tmp_out)
+            protos.save(prototypes_path(args.out))
 
     print(f"Saved index to {args.out}")
 
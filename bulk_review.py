@@ -0,0 +1,201 @@
+# bulk_review.py
+# Headless batch reviews with process_docs, for backlogs too large for the UI.
+# Files are grouped into packs (one per directory, or as a manifest says), and
+# each pack is reviewed like one upload. One JSONL record is streamed per file
+# and per pack as it finishes, then a summary record. --resume continues a
+# crashed run from the records already in --out: finished packs are skipped,
+# and files already written are not written again.
+# Usage:
+#   python bulk_review.py filings/ --out results.jsonl
+#   python bulk_review.py --manifest backlog.csv --out results.jsonl --resume --no-docx
+# A manifest is a CSV with a header: path (required), pack and process. Paths
+# are relative to the manifest; rows without a pack are grouped by directory.
+
+import argparse, csv, json, os, sys, time
+from collections import OrderedDict
+
+from metrics import Timings
+from review import process_docs, reviewed_path, start_warmup
+
+
+def is_upload(name):
+    # Skip our own output and Word lock files
+    return (name.lower().endswith(".docx") and not name.endswith("_reviewed.docx")
+            and not name.startswith("~$"))
+
+
+def discover_packs(root):
+    """Every directory under root holding .docx files is one pack, named by its path relative to root."""
+    packs = OrderedDict()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        docs = sorted(f for f in filenames if is_upload(f))
+        if docs:
+            packs[os.path.relpath(dirpath, root)] = {
+                "files": [os.path.join(dirpath, f) for f in docs], "process": None}
+    return packs
+
+
+def read_manifest(path):
+    """Packs from a CSV manifest, in the order they first appear."""
+    base = os.path.dirname(os.path.abspath(path))
+    packs = OrderedDict()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            file_path = os.path.join(base, row["path"].strip())
+            name = (row.get("pack") or "").strip() or os.path.relpath(os.path.dirname(file_path), base)
+            pack = packs.setdefault(name, {"files": [], "process": None})
+            pack["files"].append(file_path)
+            pack["process"] = pack["process"] or (row.get("process") or "").strip() or None
+    return packs
+
+
+def load_progress(path):
+    """
+    Packs finished without error and files already written by an earlier
+    run into `path`. A line torn by a crash is cut off so appending resumes
+    on a clean record boundary.
+    """
+    done_packs, done_files = set(), set()
+    if not os.path.exists(path):
+        return done_packs, done_files
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("type") == "pack" and not record.get("error"):
+            done_packs.add(record["pack"])
+        elif record.get("type") == "file":
+            done_files.add(record["path"])
+    return done_packs, done_files
+
+
+def claim_stdout():
+    """
+    A stream on the real stdout for the JSONL records; fd 1 then points at
+    stderr, so anything else printed (pool workers included) stays out of it.
+    """
+    sys.stdout.flush()
+    out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    return out
+
+
+def emit(out, record):
+    out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    out.flush()
+
+
+def review_pack(name, pack, out, args, done_files):
+    """Review one pack, streaming its file records; returns its pack record."""
+    t0 = time.perf_counter()
+    stats = {}
+
+    def on_result(file_path, issues):
+        if file_path in done_files:
+            return
+        emit(out, {"type": "file", "pack": name, "path": file_path,
+                   "reviewed_docx": None if args.no_docx else reviewed_path(file_path),
+                   "issue_count": len(issues), "issues": issues})
+
+    # Lineages keyed by pack, so same-named files of different filings stay apart
+    lineage_ids = [f"{name}/{os.path.basename(p)}" for p in pack["files"]]
+    checklist, issues = process_docs(pack["files"], pack["process"] or args.process, workers=args.workers,
+                                     stats=stats, lineage_ids=lineage_ids, annotate=not args.no_docx,
+                                     on_result=on_result)
+    return {"type": "pack", "pack": name, "files": len(pack["files"]),
+            "process": checklist.get("process"), "checklist": checklist,
+            # Findings about the pack as a whole, e.g. missing documents
+            "pack_issues": [iss for iss in issues if iss.get("document") is None],
+            "issue_count": len(issues), "seconds": round(time.perf_counter() - t0, 3),
+            "review_cache": stats.get("review_cache"), "incremental": stats.get("incremental"),
+            "timings": stats.get("timings")}
+
+
+def print_summary(summary, stream):
+    print(f"Reviewed {summary['files']} files in {summary['packs']} packs in {summary['seconds']:.1f}s "
+          f"({summary['docs_per_s']:.2f} docs/s); {summary['issues']} issues, "
+          f"{summary['failed_packs']} failed and {summary['skipped_packs']} skipped packs", file=stream)
+    timings = summary["timings"]
+    total = timings.get("total", {}).get("seconds") or 1e-9
+    print("Stage totals:", file=stream)
+    for stage, t in sorted(timings.items(), key=lambda kv: -kv[1]["seconds"]):
+        print(f"  {stage:<14} {t['seconds']:9.2f}s  {100 * t['seconds'] / total:5.1f}%  ({t['count']} calls)",
+              file=stream)
+
+
+def run(packs, out, args, done_packs=(), done_files=()):
+    started = time.perf_counter()
+    totals = Timings()
+    summary = {"type": "summary", "packs": 0, "files": 0, "issues": 0, "failed_packs": 0,
+               "skipped_packs": 0, "review_cache": {"hits": 0, "misses": 0}}
+    for n, (name, pack) in enumerate(packs.items(), 1):
+        if name in done_packs:
+            summary["skipped_packs"] += 1
+            continue
+        try:
+            record = review_pack(name, pack, out, args, done_files)
+        except Exception as e:
+            record = {"type": "pack", "pack": name, "files": len(pack["files"]),
+                      "error": f"{type(e).__name__}: {e}"}
+            summary["failed_packs"] += 1
+        else:
+            summary["packs"] += 1
+            summary["files"] += record["files"]
+            summary["issues"] += record["issue_count"]
+            for key in ("hits", "misses"):
+                summary["review_cache"][key] += (record["review_cache"] or {}).get(key, 0)
+            for stage, t in (record["timings"] or {}).items():
+                totals.add(stage, t["seconds"], t["count"])
+        emit(out, record)
+        print(f"[{n}/{len(packs)}] {name}: {record['files']} files, "
+              + (record["error"] if "error" in record else f"{record['issue_count']} issues in {record['seconds']:.1f}s"),
+              file=sys.stderr)
+    seconds = time.perf_counter() - started
+    summary.update(seconds=round(seconds, 3), docs_per_s=summary["files"] / seconds if seconds else 0.0,
+                   timings=totals.as_dict())
+    emit(out, summary)
+    return summary
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Review a backlog of .docx filings without the UI")
+    ap.add_argument("input", nargs="?", help="Directory to walk; each directory of .docx files is a pack")
+    ap.add_argument("--manifest", help="CSV with path, pack and process columns instead of a directory")
+    ap.add_argument("--out", help="JSONL output file (default: stdout)")
+    ap.add_argument("--resume", action="store_true", help="Continue an interrupted run from the records in --out")
+    ap.add_argument("--no-docx", action="store_true", help="Do not write <name>_reviewed.docx files")
+    ap.add_argument("--process", default="Auto Detect",
+                    help="Process for packs the manifest does not name, e.g. 'Company Incorporation'")
+    ap.add_argument("--workers", type=int, help="Worker processes per pack (default REVIEW_WORKERS)")
+    args = ap.parse_args(argv)
+    if bool(args.input) == bool(args.manifest):
+        ap.error("give either an input directory or --manifest")
+    if args.resume and not args.out:
+        ap.error("--resume needs --out")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    done_packs, done_files = load_progress(args.out) if args.resume else (set(), set())
+    out = open(args.out, "a" if args.resume else "w", encoding="utf-8") if args.out else claim_stdout()
+    # Load the index and model while the packs are being listed
+    start_warmup()
+    packs = read_manifest(args.manifest) if args.manifest else discover_packs(args.input)
+    try:
+        summary = run(packs, out, args, done_packs, done_files)
+    finally:
+        out.close()
+    print_summary(summary, sys.stderr)
+    return 1 if summary["failed_packs"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# citation_cache.py
+# Two-level cache (in-process LRU + SQLite on disk) for clause embeddings and
+# their top-k citation results.
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies of a clause share a key."""
+    return " ".join(text.split())
+
+
+def cache_key(text, model_name, index_version, k):
+    h = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{h}:{model_name}:{index_version}:{k}"
+
+
+class CitationCache:
+    """Cache of (vector, results) keyed by normalized text hash + model + index version.
+
+    Rows written for a different index version are dropped when the cache is
+    opened, so rebuilding the index invalidates it automatically.
+    """
+
+    def __init__(self, path, model_name, index_version, max_entries=4096):
+        self.path = path
+        self.model_name = model_name
+        self.index_version = str(index_version)
+        self.max_entries = max_entries
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS citations ("
+                "key TEXT PRIMARY KEY, model TEXT, index_version TEXT, "
+                "vector BLOB, results TEXT)"
+            )
+            self._db.execute(
+                "DELETE FROM citations WHERE model = ? AND index_version != ?",
+                (self.model_name, self.index_version),
+            )
+            self._db.commit()
+
+    def key(self, text, k):
+        return cache_key(text, self.model_name, self.index_version, k)
+
+    def get(self, text, k):
+        """Return (vector, results) or None."""
+        key = self.key(text, k)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits["memory"] += 1
+                return self._lru[key]
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, results FROM citations WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value = (np.frombuffer(row[0], dtype="float32"), json.loads(row[1]))
+            self.hits["disk"] += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, text, k, vector, results):
+        self.put_many([(text, vector, results)], k)
+
+    def put_many(self, items, k):
+        """Store (text, vector, results) triples in one disk transaction."""
+        rows = []
+        with self._lock:
+            for text, vector, results in items:
+                key = self.key(text, k)
+                vector = np.asarray(vector, dtype="float32")
+                self._remember(key, (vector, results))
+                rows.append((key, self.model_name, self.index_version,
+                             vector.tobytes(), json.dumps(results)))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO citations VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def counters(self):
+        """Raw hit and miss counts, for counts kept in another process."""
+        with self._lock:
+            return {"memory": self.hits["memory"], "disk": self.hits["disk"], "misses": self.misses}
+
+    def merge(self, counters):
+        """Add counters() recorded elsewhere, e.g. deltas from a pool worker."""
+        with self._lock:
+            self.hits["memory"] += counters.get("memory", 0)
+            self.hits["disk"] += counters.get("disk", 0)
+            self.misses += counters.get("misses", 0)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+            }
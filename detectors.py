@@ -1,33 +1,133 @@
+import hashlib
+import json
 import re
 from typing import List, Dict
 
-JURISDICTION_KEYWORDS = ['abu dhabi global market', 'adgm', 'adgm courts']
+from rules_data import RULES
+
+class RuleEngine:
+    """
+    Compiles a list of declarative rules (see rules_data.py) into one combined
+    keyword regex and evaluates every rule in a single pass over each paragraph.
+
+    Every keyword becomes a named group inside one lookahead alternation, so a
+    scan reports each position where any of them starts. Keywords are tried
+    longest first; a shorter keyword that is a substring of a matched one is
+    implied by it, so the set of keywords seen is exact. Regex patterns are
+    searched separately, one by one: in the alternation a pattern starting
+    where a keyword (or an earlier pattern) starts would never be reported.
+    """
+    def __init__(self, rules: List[Dict]):
+        self.rules = [self._validate(r) for r in rules]
+        self.version = hashlib.sha256(json.dumps(self.rules, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+        keywords = set()
+        patterns = []
+        for r in self.rules:
+            for field in ('any', 'all', 'none'):
+                keywords.update(k.lower() for k in r.get(field, []))
+            for p in r.get('regex', []):
+                if p not in patterns:
+                    patterns.append(p)
+
+        self._groups = {}
+        alternatives = []
+        for i, k in enumerate(sorted(keywords, key=lambda k: (-len(k), k))):
+            self._groups[f'k{i}'] = k
+            alternatives.append(f'(?P<k{i}>{re.escape(k)})')
+        self._patterns = [(p, re.compile(p, re.IGNORECASE)) for p in patterns]
+        self._matcher = re.compile('(?=' + '|'.join(alternatives) + ')', re.IGNORECASE) if alternatives else None
+        self._implied = {k: {o for o in keywords if o in k} for k in keywords}
+
+    @staticmethod
+    def _validate(rule: Dict) -> Dict:
+        if rule.get('scope', 'paragraph') not in ('paragraph', 'document'):
+            raise ValueError(f"Rule {rule.get('id')!r}: unknown scope {rule.get('scope')!r}")
+        if rule.get('scope', 'paragraph') == 'paragraph' and not (rule.get('any') or rule.get('all') or rule.get('regex')):
+            raise ValueError(f"Rule {rule.get('id')!r}: paragraph rules need 'any', 'all' or 'regex'")
+        for p in rule.get('regex', []):
+            re.compile(p)
+        return rule
+
+    def scan(self, text: str) -> set:
+        """Return the set of keywords and patterns occurring in text."""
+        hits = set()
+        lowered = text.lower()
+        if self._matcher is not None:
+            for m in self._matcher.finditer(lowered):
+                hits.update(self._implied[self._groups[m.lastgroup]])
+        for p, compiled in self._patterns:
+            if compiled.search(lowered):
+                hits.add(p)
+        return hits
+
+    @staticmethod
+    def _fires(rule: Dict, hits: set) -> bool:
+        if any(k.lower() in hits for k in rule.get('none', [])):
+            return False
+        if not all(k.lower() in hits for k in rule.get('all', [])):
+            return False
+        triggers = [k.lower() for k in rule.get('any', [])] + list(rule.get('regex', []))
+        return not triggers or any(t in hits for t in triggers)
+
+    @staticmethod
+    def _issue(rule: Dict, para_index: int, match_text: str) -> Dict:
+        return {
+            'para_index': para_index,
+            'match_text': match_text,
+            'issue_text': rule.get('issue_text', ''),
+            'severity': rule.get('severity', 'Medium'),
+            'suggestion': rule.get('suggestion', ''),
+            'citation': '',
+            'rule': rule.get('id'),
+        }
+
+    def run(self, paragraphs: List[str], hits: List = None, only=None) -> List[Dict]:
+        """
+        Evaluate every rule; issues are grouped by rule, in paragraph order.
+
+        For incremental re-review, hits may hold earlier scan() results per
+        paragraph; None entries are scanned and filled in place, so the list
+        is complete afterwards. only restricts paragraph-scope rules to those
+        paragraph indices; document-scope rules always see every paragraph.
+        """
+        if hits is None:
+            hits = [None] * len(paragraphs)
+        for i, p in enumerate(paragraphs):
+            if hits[i] is None:
+                hits[i] = self.scan(p)
+        per_rule = [[] for _ in self.rules]
+        paragraph_rules = [(n, r) for n, r in enumerate(self.rules) if r.get('scope', 'paragraph') == 'paragraph']
+        for i in (range(len(paragraphs)) if only is None else sorted(only)):
+            for n, rule in paragraph_rules:
+                if hits[i] and self._fires(rule, hits[i]):
+                    per_rule[n].append(self._issue(rule, i, paragraphs[i]))
+        document_hits = set().union(*hits)
+        for n, rule in enumerate(self.rules):
+            if rule.get('scope') == 'document' and self._fires(rule, document_hits):
+                per_rule[n].append(self._issue(rule,
+                                               len(paragraphs)-1 if paragraphs else 0,
+                                               paragraphs[-1] if paragraphs else ''))
+        return [iss for issues in per_rule for iss in issues]
+
+def load_rules(path: str) -> List[Dict]:
+    """Load a rule set from a JSON file holding a list of rule dicts."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _rules_by_id(*ids: str) -> List[Dict]:
+    return [r for r in RULES if r['id'] in ids]
+
+DEFAULT_ENGINE = RuleEngine(RULES)
+_JURISDICTION_ENGINE = RuleEngine(_rules_by_id('jurisdiction_not_adgm'))
+_SIGNATORY_ENGINE = RuleEngine(_rules_by_id('missing_signatory'))
+
+def run_rules(paragraphs: List[str], engine: RuleEngine = None) -> List[Dict]:
+    """Run every rule of the engine (the bundled RULES by default) in one pass."""
+    return (engine or DEFAULT_ENGINE).run(paragraphs)
 
 def check_jurisdiction(paragraphs: List[str]) -> List[Dict]:
-    issues = []
-    for i, p in enumerate(paragraphs):
-        lower = p.lower()
-        if ('jurisdiction' in lower or 'court' in lower) and not any(k in lower for k in JURISDICTION_KEYWORDS):
-            issues.append({
-                'para_index': i,
-                'match_text': p,
-                'issue_text': 'Jurisdiction clause does not specify ADGM.',
-                'severity': 'High',
-                'suggestion': 'Update jurisdiction clause to specify Abu Dhabi Global Market (ADGM) courts.',
-                'citation': ''
-            })
-    return issues
+    return _JURISDICTION_ENGINE.run(paragraphs)
 
 def check_missing_signatory(paragraphs: List[str]) -> List[Dict]:
-    issues = []
-    text = ' '.join(paragraphs).lower()
-    if 'signature' not in text and 'signed' not in text and 'signatory' not in text:
-        issues.append({
-            'para_index': len(paragraphs)-1 if paragraphs else 0,
-            'match_text': paragraphs[-1] if paragraphs else '',
-            'issue_text': 'Document appears to lack a signatory block or signature lines.',
-            'severity': 'High',
-            'suggestion': 'Add signatory panel with printed name, title, date and signature.',
-            'citation': ''
-        })
-    return issues
+    return _SIGNATORY_ENGINE.run(paragraphs)
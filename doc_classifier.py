@@ -0,0 +1,153 @@
+# doc_classifier.py
+# Content-based process and checklist-document classification. Every
+# CHECKLISTS document name is embedded once into a prototype vector (and each
+# process gets the normalized mean of its documents); an uploaded file is
+# represented by an embedding of its first few paragraphs, so a whole pack is
+# classified with one encode call and one matrix product.
+
+import hashlib
+import json
+import os
+from itertools import islice
+
+import numpy as np
+
+from docx_utils import iter_paragraphs
+
+PROTOTYPES_FILE = "prototypes.npz"
+# Paragraphs sampled from the top of each document (titles and recitals)
+SAMPLE_PARAGRAPHS = 10
+SAMPLE_CHARS = 1000
+# A label needs min_score and a lead of min_margin over the runner-up;
+# prototypes are bare document names, so near-ties are noise, not evidence
+MIN_SCORE = 0.3
+MIN_MARGIN = 0.05
+
+
+def checklist_version(checklists):
+    return hashlib.sha256(json.dumps(checklists, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def prototypes_path(index_path):
+    """Prototype file stored alongside an index directory or legacy pickle."""
+    if os.path.isdir(index_path):
+        return os.path.join(index_path, PROTOTYPES_FILE)
+    return os.path.splitext(index_path)[0] + "." + PROTOTYPES_FILE
+
+
+def _normalize(m):
+    m = np.asarray(m, dtype="float32")
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-9)
+
+
+class Prototypes:
+    """
+    doc_vectors[i] is the prototype of labels[i] = (process, document name);
+    process_vectors[j] that of processes[j]. Rows are unit length.
+    """
+
+    def __init__(self, labels, doc_vectors, processes, process_vectors, model, version):
+        self.labels = [tuple(l) for l in labels]
+        self.doc_vectors = _normalize(doc_vectors)
+        self.processes = list(processes)
+        self.process_vectors = _normalize(process_vectors)
+        self.model = model
+        self.version = version
+        self._label_process = np.array([self.processes.index(p) for p, _ in self.labels])
+
+    @classmethod
+    def build(cls, encode, checklists, model):
+        """encode(texts) -> (n, dim) array; one call for every document name."""
+        labels = [(process, doc) for process, docs in checklists.items() for doc in docs]
+        doc_vectors = _normalize(encode([doc for _, doc in labels]))
+        processes = list(checklists)
+        process_vectors = [doc_vectors[[i for i, (p, _) in enumerate(labels) if p == process]].mean(axis=0)
+                           for process in processes]
+        return cls(labels, doc_vectors, processes, process_vectors, model, checklist_version(checklists))
+
+    def save(self, path):
+        meta = {"labels": self.labels, "processes": self.processes,
+                "model": self.model, "version": self.version}
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, doc_vectors=self.doc_vectors, process_vectors=self.process_vectors,
+                 meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(meta["labels"], data["doc_vectors"], meta["processes"], data["process_vectors"],
+                       meta["model"], meta["version"])
+
+    def classify(self, sample_vectors, min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        """
+        Classify a pack in one matrix product. Returns (process, documents):
+        process is the best-scoring process for the pack, or None when no
+        file reaches min_score or the runner-up process is within
+        min_margin per file; documents[i] is the (process, document name,
+        score) best matching file i within that process, as match() gives.
+        """
+        if len(sample_vectors) == 0:
+            return None, []
+        sims = self.similarities(sample_vectors)
+        # A pack scores for a process by how well each file matches its best document there
+        per_process = np.full((sims.shape[0], len(self.processes)), -1.0, dtype="float32")
+        for j in range(len(self.processes)):
+            cols = self._label_process == j
+            per_process[:, j] = sims[:, cols].max(axis=1)
+        pack = np.where(per_process >= min_score, per_process, 0).sum(axis=0)
+        order = np.argsort(-pack, kind="stable")
+        best_process = int(order[0])
+        process = self.processes[best_process]
+        lead = pack[best_process] - (pack[order[1]] if len(order) > 1 else 0.0)
+        if not (per_process[:, best_process] >= min_score).any() or lead < min_margin * sims.shape[0]:
+            process = None
+        return process, self.match(sims, process or self.processes[best_process], min_score, min_margin)
+
+    def match(self, sims, process, min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        """
+        Best document of `process` for each row of a files x documents
+        similarity matrix. The name is None unless the score reaches
+        min_score and beats the process's next-best document by min_margin.
+        """
+        cols = np.flatnonzero(self._label_process == self.processes.index(process))
+        ranked = np.argsort(-sims[:, cols], axis=1, kind="stable")
+        best = cols[ranked[:, 0]]
+        rows = np.arange(sims.shape[0])
+        scores = sims[rows, best]
+        runner_up = sims[rows, cols[ranked[:, 1]]] if len(cols) > 1 else np.full(len(rows), -1.0)
+        return [(process, self.labels[b][1] if s >= min_score and s - r >= min_margin else None, float(s))
+                for b, s, r in zip(best, scores, runner_up)]
+
+    def similarities(self, sample_vectors):
+        """files x documents cosine similarities, as used by match()."""
+        return _normalize(sample_vectors) @ self.doc_vectors.T
+
+
+def load_or_build(index_path, encode, checklists, model):
+    """Prototypes stored next to the index, rebuilt (and re-saved when
+    possible) if missing or made for another model or checklist version."""
+    path = prototypes_path(index_path)
+    if os.path.exists(path):
+        try:
+            protos = Prototypes.load(path)
+            if protos.model == model and protos.version == checklist_version(checklists):
+                return protos
+        except Exception as e:
+            print(f"Ignoring unreadable prototypes {path}: {e}")
+    protos = Prototypes.build(encode, checklists, model)
+    try:
+        protos.save(path)
+    except OSError as e:
+        print(f"Could not save prototypes to {path}: {e}")
+    return protos
+
+
+def document_sample(path, n=SAMPLE_PARAGRAPHS, max_chars=SAMPLE_CHARS):
+    """Text of a document's first n paragraphs, read without parsing the rest."""
+    try:
+        text = " ".join(p.text for p in islice(iter_paragraphs(path, headers_footers=False), n))
+    except Exception:
+        text = ""
+    return text[:max_chars] or os.path.basename(path)
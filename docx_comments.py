@@ -1,116 +1,272 @@
-
-\"\"\"Add Word comments to a .docx file.
-This script provides functions to add simple Word comment objects to an existing .docx file.
-It uses python-docx to create/modify content and then injects comments.xml and relationships.
-Note: This approach is a reasonable workaround but may not cover all edge cases. Always keep backups.
-\"\"\"
-import zipfile
-import shutil
+"""Add Word comments to a .docx file.
+The source package is streamed part by part into the destination: media,
+styles and every other unchanged part are copied as raw compressed bytes,
+and only word/document.xml, word/comments.xml, the document rels and
+[Content_Types].xml are rewritten. Each comment is anchored on the first
+paragraph matching it (commentRangeStart / commentRangeEnd plus a
+commentReference run), so Word shows it in the review pane.
+"""
+import copy
 import os
-from xml.etree import ElementTree as ET
-from docx import Document
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from lxml import etree
+
+from docx_utils import _paragraph_xml_text
 
-# Namespaces for WordprocessingML
+# Namespaces for WordprocessingML and OPC packaging
 NS = {
     'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+    'ct': 'http://schemas.openxmlformats.org/package/2006/content-types',
 }
+DOCUMENT_PART = 'word/document.xml'
+COMMENTS_PART = 'word/comments.xml'
+RELS_PART = 'word/_rels/document.xml.rels'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+COMMENTS_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments'
+COMMENTS_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml'
+COPY_CHUNK = 1 << 20
 
-def _new_comment_xml(comments):
-    \"\"\"Create comments.xml content given a list of dicts: {'id': int, 'author': str, 'date': str, 'text': str} \"\"\"
-    ET.register_namespace('w', NS['w'])
-    comments_root = ET.Element(f"{{{NS['w']}}}comments")
-    for c in comments:
-        comment_el = ET.SubElement(comments_root, f\"{{{NS['w']}}}comment\", attrib={
-            f\"{{{NS['w']}}}id\": str(c['id']),
-            f\"{{{NS['w']}}}author\": c.get('author','Reviewer'),
-            f\"{{{NS['w']}}}date\": c.get('date','2025-01-01T00:00:00Z')
-        })
-        p = ET.SubElement(comment_el, f\"{{{NS['w']}}}p\")
-        r = ET.SubElement(p, f\"{{{NS['w']}}}r\")
-        t = ET.SubElement(r, f\"{{{NS['w']}}}t\")
-        t.text = c['text']
-    return ET.tostring(comments_root, encoding='utf-8', xml_declaration=True)
+def _w(tag):
+    return f"{{{NS['w']}}}{tag}"
 
-def add_comments_to_docx(src_docx_path, dst_docx_path, comments_map):
-    \"\"\"Add comments to a docx. comments_map is a list of dicts:
-       [{'para_text_match': 'some text', 'comment_id': 0, 'author': 'Reviewer', 'text': 'Comment body'}, ...]
-       This function injects a comments.xml and inserts commentReference markers next to matched paragraph text.
-       This is a heuristic approach and may not work for very complex documents.
-    \"\"\"
-    # Work on a temp copy
-    tmp_dir = src_docx_path + \"_tmp_unzip\"
-    if os.path.exists(tmp_dir):
-        shutil.rmtree(tmp_dir)
-    os.makedirs(tmp_dir, exist_ok=True)
-    with zipfile.ZipFile(src_docx_path, 'r') as zin:
-        zin.extractall(tmp_dir)
-    document_xml = os.path.join(tmp_dir, 'word', 'document.xml')
-    tree = ET.parse(document_xml)
-    root = tree.getroot()
-
-    # Build comments data for comments.xml and track next available id
-    comments = []
-    next_id = 0
-    for cm in comments_map:
-        comments.append({'id': next_id, 'author': cm.get('author','Reviewer'), 'date': cm.get('date','2025-01-01T00:00:00Z'), 'text': cm.get('text','')})
-        next_id += 1
-
-    comments_xml_content = _new_comment_xml(comments)
-    # write comments.xml
-    comments_xml_path = os.path.join(tmp_dir, 'word', 'comments.xml')
-    with open(comments_xml_path, 'wb') as f:
-        f.write(comments_xml_content)
-
-    # ensure _rels entry for comments in word/_rels/document.xml.rels
-    rels_path = os.path.join(tmp_dir, 'word', '_rels', 'document.xml.rels')
-    if os.path.exists(rels_path):
-        rels_tree = ET.parse(rels_path)
-        rels_root = rels_tree.getroot()
+def _serialize(root):
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+def _paragraph_text(p):
+    # Direct and hyperlink runs only, like ReviewDocument: text that sits only
+    # in a tracked insertion or a text box must not shift the para_index count
+    return _paragraph_xml_text(p)
+
+def _iter_paragraphs(parent):
+    """
+    Body paragraphs in document order, descending into table cells, the
+    same walk docx_utils.ReviewDocument does. Merged-cell continuations are
+    separate (empty) w:tc elements here, so they drop out with the empties.
+    """
+    for child in parent:
+        if child.tag == _w('p'):
+            yield child
+        elif child.tag == _w('tbl'):
+            for tc in child.iterfind(f"{_w('tr')}/{_w('tc')}"):
+                yield from _iter_paragraphs(tc)
+
+def _find_anchor(paragraphs, cm):
+    """Paragraph for a comment: 'para_index' first, then 'para_text_match' (case-insensitive)."""
+    idx = cm.get('para_index')
+    if idx is not None and 0 <= idx < len(paragraphs):
+        return paragraphs[idx][0]
+    needle = (cm.get('para_text_match') or '').lower()
+    if needle:
+        for p, text in paragraphs:
+            if needle in text.lower():
+                return p
+    return None
+
+def _anchor_comment(p, comment_id):
+    """Wrap the paragraph's content in a comment range and add the reference run."""
+    start = etree.Element(_w('commentRangeStart'), {_w('id'): str(comment_id)})
+    ppr = p.find(_w('pPr'))
+    p.insert(p.index(ppr) + 1 if ppr is not None else 0, start)
+    etree.SubElement(p, _w('commentRangeEnd'), {_w('id'): str(comment_id)})
+    ref_run = etree.SubElement(p, _w('r'))
+    etree.SubElement(ref_run, _w('commentReference'), {_w('id'): str(comment_id)})
+
+def _new_comment(parent, comment_id, cm, default_date):
+    """Append one w:comment: {'author': str, 'initials': str, 'date': str, 'text': str}."""
+    author = cm.get('author', 'Reviewer')
+    comment_el = etree.SubElement(parent, _w('comment'), {
+        _w('id'): str(comment_id),
+        _w('author'): author,
+        _w('date'): cm.get('date', default_date),
+        _w('initials'): cm.get('initials', ''.join(w[0] for w in author.split())[:4]),
+    })
+    p = etree.SubElement(comment_el, _w('p'))
+    ref = etree.SubElement(p, _w('r'))
+    etree.SubElement(ref, _w('annotationRef'))
+    r = etree.SubElement(p, _w('r'))
+    t = etree.SubElement(r, _w('t'))
+    t.text = cm.get('text', '')
+    t.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+
+def _ensure_comments_rel(rels_root):
+    for rel in rels_root.iterfind(f"{{{NS['rel']}}}Relationship"):
+        if rel.get('Type') == COMMENTS_REL_TYPE:
+            return
+    ids = [rel.get('Id', '') for rel in rels_root.iterfind(f"{{{NS['rel']}}}Relationship")]
+    nums = [int(i[3:]) for i in ids if i.startswith('rId') and i[3:].isdigit()]
+    etree.SubElement(rels_root, f"{{{NS['rel']}}}Relationship", {
+        'Id': f"rId{max(nums, default=0) + 1}",
+        'Type': COMMENTS_REL_TYPE,
+        'Target': 'comments.xml',
+    })
+
+def _ensure_comments_override(ct_root):
+    for o in ct_root.iterfind(f"{{{NS['ct']}}}Override"):
+        if o.get('PartName') == '/' + COMMENTS_PART:
+            return
+    etree.SubElement(ct_root, f"{{{NS['ct']}}}Override", {
+        'PartName': '/' + COMMENTS_PART,
+        'ContentType': COMMENTS_CONTENT_TYPE,
+    })
+
+ZIP64_EXTRA_ID = 0x0001
+DATA_DESCRIPTOR_FLAG = 0x08
+ENCRYPTED_FLAG = 0x01
+
+def _strip_zip64_extra(extra):
+    """Drop zip64 records from an extra field; zipfile writes fresh ones for the new offsets and sizes."""
+    out, i = [], 0
+    while i + 4 <= len(extra):
+        tag = int.from_bytes(extra[i:i + 2], 'little')
+        end = i + 4 + int.from_bytes(extra[i + 2:i + 4], 'little')
+        if tag != ZIP64_EXTRA_ID:
+            out.append(extra[i:end])
+        i = end
+    return b''.join(out)
+
+def _copy_raw(zin, zout, info):
+    """
+    Copy one member's compressed bytes unchanged, with no inflate/deflate
+    round trip. zipfile has no public API for this, so the local header is
+    written here and the member registered for the central directory.
+    Sizes and CRC go in the local header (the data-descriptor flag is
+    cleared); FileHeader() and the central directory add zip64 records
+    whenever the sizes or offset need them.
+    """
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename!r}")
+    name_len = int.from_bytes(header[26:28], 'little')
+    extra_len = int.from_bytes(header[28:30], 'little')
+    zin.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+
+    out = copy.copy(info)
+    out.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    out.extra = _strip_zip64_extra(info.extra)
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename!r}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+def _recompress_member(zin, zout, info):
+    """Public-API copy, COPY_CHUNK bytes at a time; the member is inflated and deflated again."""
+    out = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    out.compress_type = info.compress_type
+    out.external_attr = info.external_attr
+    out.comment = info.comment
+    out.file_size = info.file_size
+    with zin.open(info) as src, zout.open(out, 'w', force_zip64=info.file_size >= zipfile.ZIP64_LIMIT) as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+def _copy_member(zin, zout, info):
+    """Copy an unchanged member raw; encrypted members, or a zipfile without
+    the internals _copy_raw relies on, take the recompressing path."""
+    if info.flag_bits & ENCRYPTED_FLAG or not all(
+            hasattr(zout, attr) for attr in ('fp', 'filelist', 'NameToInfo', 'start_dir', '_didModify')):
+        _recompress_member(zin, zout, info)
     else:
-        # create minimal relationships root
-        rels_root = ET.Element('Relationships', xmlns='http://schemas.openxmlformats.org/package/2006/relationships')
-
-    # add relationship if missing
-    existing = False
-    for rel in rels_root.findall('{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'):
-        if rel.get('Type','').endswith('/comments'):
-            existing = True
-            break
-    if not existing:
-        r_attrib = {
-            'Id': 'rId1000',
-            'Type': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments',
-            'Target': 'comments.xml'
-        }
-        ET.SubElement(rels_root, 'Relationship', r_attrib)
-
-    # Save rels
-    rels_tree = ET.ElementTree(rels_root)
-    rels_tree.write(rels_path, encoding='utf-8', xml_declaration=True)
-
-    # NOTE: inserting commentRangeStart/commentRangeEnd and commentReference into document.xml is complex.
-    # For a robust solution, use python-docx with an extension or external library. Here we will append a simple paragraph per comment
-    # that contains the comment text and a marker, to ensure the reviewer sees the comment in the document.
-    body = root.find('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}body')
-    for idx, cm in enumerate(comments_map, start=1):
-        p = ET.SubElement(body, '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p')
-        r = ET.SubElement(p, '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}r')
-        t = ET.SubElement(r, '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t')
-        t.text = f\"[COMMENT #{idx} by {cm.get('author','Reviewer')}] {cm.get('text','')}\"
-
-    # write modified document.xml back
-    tree.write(document_xml, encoding='utf-8', xml_declaration=True)
-
-    # Repack to new docx
-    with zipfile.ZipFile(dst_docx_path, 'w', zipfile.ZIP_DEFLATED) as zout:
-        for folder, subs, files in os.walk(tmp_dir):
-            for filename in files:
-                file_path = os.path.join(folder, filename)
-                arcname = os.path.relpath(file_path, tmp_dir)
-                zout.write(file_path, arcname)
-    # cleanup
-    shutil.rmtree(tmp_dir)
+        _copy_raw(zin, zout, info)
+
+def _write_part(zout, info, name, data):
+    zi = zipfile.ZipInfo(name, date_time=info.date_time if info else datetime.now().timetuple()[:6])
+    zi.compress_type = zipfile.ZIP_DEFLATED
+    zi.external_attr = info.external_attr if info else 0o600 << 16
+    zout.writestr(zi, data)
+
+def add_comments_to_docx(src_docx_path, dst_docx_path, comments_map):
+    """Add comments to a docx. comments_map is a list of dicts:
+       [{'para_text_match': 'some text', 'author': 'Reviewer', 'text': 'Comment body'}, ...]
+       A comment may give 'para_index' (non-empty paragraphs, indexed like
+       docx_utils.ReviewDocument) instead of 'para_text_match', plus 'date'
+       and 'initials'. Comments whose paragraph cannot be found are anchored
+       on the last paragraph. Existing comments in the source are kept.
+       dst_docx_path may equal src_docx_path; the destination is replaced
+       atomically once fully written.
+    """
+    default_date = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    dst_dir = os.path.dirname(os.path.abspath(dst_docx_path))
+    fd, tmp_path = tempfile.mkstemp(suffix='.docx.part', dir=dst_dir)
+    try:
+        with zipfile.ZipFile(src_docx_path, 'r') as zin, os.fdopen(fd, 'wb') as fout, \
+                zipfile.ZipFile(fout, 'w', zipfile.ZIP_DEFLATED) as zout:
+            infos = {info.filename: info for info in zin.infolist()}
+            doc_root = etree.fromstring(zin.read(DOCUMENT_PART))
+            if COMMENTS_PART in infos:
+                comments_root = etree.fromstring(zin.read(COMMENTS_PART))
+            else:
+                comments_root = etree.Element(_w('comments'), nsmap={'w': NS['w']})
+            if RELS_PART in infos:
+                rels_root = etree.fromstring(zin.read(RELS_PART))
+            else:
+                rels_root = etree.Element(f"{{{NS['rel']}}}Relationships", nsmap={None: NS['rel']})
+            ct_root = etree.fromstring(zin.read(CONTENT_TYPES_PART))
+
+            # New ids continue after any comments already in the document
+            existing = [int(c.get(_w('id'))) for c in comments_root.iterfind(_w('comment'))
+                        if (c.get(_w('id')) or '').lstrip('-').isdigit()]
+            next_id = max(existing, default=-1) + 1
+
+            body = doc_root.find(_w('body'))
+            paragraphs = []
+            for p in _iter_paragraphs(body):
+                text = _paragraph_text(p)
+                if text.strip():
+                    paragraphs.append((p, text))
+            for cm in comments_map:
+                anchor = _find_anchor(paragraphs, cm)
+                if anchor is None:
+                    if not paragraphs:
+                        # Empty document: give the comments a paragraph to sit on
+                        p = etree.Element(_w('p'))
+                        sect = body.find(_w('sectPr'))
+                        body.insert(body.index(sect) if sect is not None else len(body), p)
+                        paragraphs.append((p, ''))
+                    anchor = paragraphs[-1][0]
+                _anchor_comment(anchor, next_id)
+                _new_comment(comments_root, next_id, cm, default_date)
+                next_id += 1
+
+            _ensure_comments_rel(rels_root)
+            _ensure_comments_override(ct_root)
+            rewritten = {
+                DOCUMENT_PART: _serialize(doc_root),
+                COMMENTS_PART: _serialize(comments_root),
+                RELS_PART: _serialize(rels_root),
+                CONTENT_TYPES_PART: _serialize(ct_root),
+            }
+
+            for info in zin.infolist():
+                if info.filename in rewritten:
+                    _write_part(zout, info, info.filename, rewritten.pop(info.filename))
+                else:
+                    _copy_member(zin, zout, info)
+            # Parts the source did not have (comments.xml, possibly the rels)
+            for name, data in rewritten.items():
+                _write_part(zout, None, name, data)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600
+        os.replace(tmp_path, dst_docx_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     return dst_docx_path
 
 if __name__ == '__main__':
@@ -3,21 +3,196 @@ from docx import Document
 from docx.enum.text import WD_COLOR_INDEX
 from docx.shared import Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from typing import List, Dict
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Union
+from itertools import islice
+from lxml import etree
+import posixpath
 import re
+import zipfile
 
-def extract_paragraphs(doc_path: str) -> List[str]:
+# Changes whenever the paragraphs ReviewDocument.texts yields change (2: headers
+# and footers follow the body); cached reviews and lineages key on it
+EXTRACTOR_VERSION = 2
+
+def _iter_block_paragraphs(parent, blocks):
+    """
+    Yield Paragraph objects under a body or table cell in document order,
+    descending into tables (and nested tables). Merged cells are visited once.
+    """
+    seen_cells = set()
+    for child in blocks:
+        if child.tag == qn("w:p"):
+            yield Paragraph(child, parent)
+        elif child.tag == qn("w:tbl"):
+            for row in Table(child, parent).rows:
+                for cell in row.cells:
+                    if id(cell._tc) in seen_cells:
+                        continue
+                    seen_cells.add(id(cell._tc))
+                    yield from _iter_block_paragraphs(cell, cell._tc.iterchildren())
+
+class ReviewDocument:
+    """
+    A .docx read once and shared by the detectors and the annotation writer.
+      - texts: every non-empty paragraph, read with iter_paragraphs: body and
+        table cells in document order, then headers and footers; position i
+        is the 'para_index' detectors report
+      - locations: where each text sits ('body', 'table', 'header1', ...)
+      - body_count: texts[:body_count] are the body and table paragraphs
+      - doc / paragraphs: the python-docx Document and the Paragraph objects
+        of the body texts, parsed on first use (only annotation needs them)
     """
-    Return a list of non-empty paragraph texts from a .docx file.
+    def __init__(self, path: str):
+        self.path = path
+        self.texts = []
+        self.locations = []
+        for p in iter_paragraphs(path):
+            self.texts.append(p.text)
+            self.locations.append(p.location)
+        self.body_count = sum(1 for loc in self.locations if loc in ("body", "table"))
+        self._doc = None
+        self._paragraphs = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self._doc = Document(self.path)
+        return self._doc
+
+    @property
+    def paragraphs(self) -> List[Paragraph]:
+        if self._paragraphs is None:
+            body = self.doc.element.body
+            self._paragraphs = [p for p in _iter_block_paragraphs(self.doc._body, body.iterchildren())
+                                if p.text and p.text.strip()]
+        return self._paragraphs
+
+class DocxParagraph(NamedTuple):
+    index: int      # position among all yielded paragraphs
+    text: str
+    location: str   # 'body', 'table', or the header/footer part, e.g. 'header1'
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_RUN_TEXT = {f"{{{_W_NS}}}t": None, f"{{{_W_NS}}}tab": "\t", f"{{{_W_NS}}}ptab": "\t",
+             f"{{{_W_NS}}}cr": "\n", f"{{{_W_NS}}}noBreakHyphen": "-"}
+_BR = f"{{{_W_NS}}}br"
+_R = f"{{{_W_NS}}}r"
+_HYPERLINK = f"{{{_W_NS}}}hyperlink"
+_P = f"{{{_W_NS}}}p"
+_TBL = f"{{{_W_NS}}}tbl"
+_TC = f"{{{_W_NS}}}tc"
+
+def _run_text(r) -> str:
+    # Same translation as python-docx's CT_R.text
+    out = []
+    for e in r:
+        if e.tag in _RUN_TEXT:
+            fixed = _RUN_TEXT[e.tag]
+            out.append((e.text or "") if fixed is None else fixed)
+        elif e.tag == _BR and e.get(f"{{{_W_NS}}}type", "textWrapping") == "textWrapping":
+            out.append("\n")
+    return "".join(out)
+
+def _paragraph_xml_text(p) -> str:
+    # Same as python-docx's Paragraph.text: direct runs and hyperlink runs only
+    out = []
+    for e in p:
+        if e.tag == _R:
+            out.append(_run_text(e))
+        elif e.tag == _HYPERLINK:
+            out.extend(_run_text(r) for r in e if r.tag == _R)
+    return "".join(out)
+
+def _iter_part_paragraphs(stream, container_tag):
     """
-    doc = Document(doc_path)
-    return [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
+    Yield (text, in_table) for every paragraph directly under the part's
+    container (w:body, w:hdr, w:ftr) or a table cell, in document order.
+    Elements are freed as soon as they are read, so memory stays bounded by
+    the largest top-level block rather than the document.
+    """
+    container = f"{{{_W_NS}}}{container_tag}"
+    for _, el in etree.iterparse(stream, events=("end",), tag=(_P, _TBL), huge_tree=True):
+        parent = el.getparent()
+        if el.tag == _P and parent is not None and parent.tag in (container, _TC):
+            yield _paragraph_xml_text(el), parent.tag == _TC
+        if parent is not None and parent.tag == container:
+            # Top-level block done: drop it and everything before it
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+        elif el.tag == _P:
+            el.clear(keep_tail=True)
+
+def _header_footer_parts(zf) -> List[str]:
+    """Header and footer part names, headers first, each in numeric order."""
+    try:
+        rels = etree.fromstring(zf.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return []
+    parts = []
+    for rel in rels.iterfind(f"{{{_REL_NS}}}Relationship"):
+        kind = rel.get("Type", "").rsplit("/", 1)[-1]
+        if kind in ("header", "footer") and rel.get("TargetMode") != "External":
+            target = rel.get("Target", "")
+            name = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+            parts.append((kind != "header", len(name), name))
+    return [name for _, _, name in sorted(parts)]
+
+def iter_paragraphs(doc_path: str, headers_footers: bool = True) -> Iterator[DocxParagraph]:
+    """
+    Stream the non-empty paragraphs of a .docx straight from its zip with
+    incremental XML parsing: body paragraphs and table cells first, in the
+    order (and with the indices) ReviewDocument.texts uses, then headers and
+    footers. Stopping early (e.g. islice) skips parsing the rest.
+    """
+    index = 0
+    with zipfile.ZipFile(doc_path) as zf:
+        with zf.open("word/document.xml") as stream:
+            for text, in_table in _iter_part_paragraphs(stream, "body"):
+                text = text.strip()
+                if text:
+                    yield DocxParagraph(index, text, "table" if in_table else "body")
+                    index += 1
+        if not headers_footers:
+            return
+        for part in _header_footer_parts(zf):
+            location = posixpath.splitext(posixpath.basename(part))[0]
+            container = "hdr" if location.startswith("header") else "ftr"
+            try:
+                stream = zf.open(part)
+            except KeyError:
+                continue
+            with stream:
+                for text, _ in _iter_part_paragraphs(stream, container):
+                    text = text.strip()
+                    if text:
+                        yield DocxParagraph(index, text, location)
+                        index += 1
+
+def extract_paragraphs(doc_path: str, headers_footers: bool = True) -> List[str]:
+    """
+    Return a list of non-empty paragraph texts from a .docx file, including
+    table cells and (unless headers_footers is false) header and footer
+    paragraphs after the body, indexed the same way as ReviewDocument.texts.
+    """
+    return [p.text for p in iter_paragraphs(doc_path, headers_footers)]
+
+def detect_document_type(doc_path: str, limit: int = 30) -> str:
+    """detect_headings on a file, parsing only its first `limit` paragraphs."""
+    return detect_headings((p.text for p in iter_paragraphs(doc_path, headers_footers=False)), limit)
 
-def detect_headings(paragraphs: List[str]) -> str:
+def detect_headings(paragraphs: Iterable[str], limit: int = 30) -> str:
     """
     Simple heuristics to guess document type from the first ~30 paragraphs.
+    Only the first `limit` items are consumed, so a streaming iterator
+    (see iter_paragraphs) is not read any further.
     """
-    text = " ".join(paragraphs[:30]).lower()
+    text = " ".join(islice(paragraphs, limit)).lower()
     if "articles of association" in text or re.search(r'\b[aA][oO][aA]\b', text):
         return "Articles of Association"
     if "memorandum of association" in text or re.search(r'\b[mM][oO][aA]\b', text):
@@ -27,11 +202,66 @@ def detect_headings(paragraphs: List[str]) -> str:
     # Add more heuristics as needed
     return "Unknown"
 
-def annotate_and_save(original_path: str,
-                      issues: List[Dict],
-                      output_path: str):
+def _body_appender(doc):
+    """
+    Return an add_paragraph(text) that appends to the end of the body in O(1).
+    Document.add_paragraph looks for w:sectPr among all body children on
+    every call, which makes a long issues appendix quadratic.
+    """
+    body = doc.element.body
+    sect_pr = body.find(qn("w:sectPr"))
+
+    def add_paragraph(text=""):
+        p = OxmlElement("w:p")
+        if sect_pr is not None:
+            sect_pr.addprevious(p)
+        else:
+            body.append(p)
+        paragraph = Paragraph(p, doc._body)
+        if text:
+            paragraph.add_run(text)
+        return paragraph
+    return add_paragraph
+
+def resolve_issue_paragraphs(review_doc: ReviewDocument, issues: List[Dict]) -> List:
     """
-    Annotate the original .docx with:
+    Map each issue to an index into review_doc.paragraphs (or None).
+    'para_index' is used directly when it still points at the matched text;
+    otherwise the text is looked up in a table built once per document, and
+    only issues that quote part of a paragraph fall back to a substring scan.
+    Header and footer paragraphs are not in the body, so their issues map to
+    None.
+    """
+    texts = review_doc.texts[:min(review_doc.body_count, len(review_doc.paragraphs))]
+    by_text = {}
+    for i, t in enumerate(texts):
+        by_text.setdefault(t, i)
+
+    targets = []
+    for iss in issues:
+        match_text = iss.get("match_text", "")
+        pi = iss.get("para_index")
+        if not match_text:
+            targets.append(None)
+        elif isinstance(pi, int) and 0 <= pi < len(texts) and match_text in texts[pi]:
+            targets.append(pi)
+        elif match_text.strip() in by_text:
+            targets.append(by_text[match_text.strip()])
+        else:
+            targets.append(next((i for i, t in enumerate(texts) if match_text in t), None))
+    return targets
+
+def _issue_location(review_doc: ReviewDocument, iss: Dict):
+    """Header or footer part an issue's para_index points at, else None."""
+    pi = iss.get("para_index")
+    if isinstance(pi, int) and review_doc.body_count <= pi < len(review_doc.texts):
+        return review_doc.locations[pi]
+    return None
+
+def annotate_document(original_path: Union[str, ReviewDocument], issues: List[Dict]):
+    """
+    Annotate the original .docx in memory and return the python-docx
+    Document; annotate_and_save() writes it out. Adds:
       - yellow highlight on paragraphs that match issues
       - inline anchors like [ISSUE #n] appended to matched paragraphs
       - an appended "REVIEW ISSUES" section enumerating all issues
@@ -42,45 +272,53 @@ def annotate_and_save(original_path: str,
       - 'severity' (str)
       - 'suggestion' (str)
       - 'citation' (str)
+    original_path may be an already parsed ReviewDocument, which is then
+    annotated in place instead of re-reading the file.
     """
-    doc = Document(original_path)
+    review_doc = original_path if isinstance(original_path, ReviewDocument) else ReviewDocument(original_path)
+    doc = review_doc.doc
+    paragraphs = review_doc.paragraphs
+    add_paragraph = _body_appender(doc)
 
-    # Map each issue to an index number for anchors
-    # We'll try to match by substring match_text in paragraph text
-    issue_counter = 1
-    for iss in issues:
-        match_text = iss.get("match_text", "")
-        found = False
-        if match_text:
-            # Find the first paragraph that contains the match_text
-            for p in doc.paragraphs:
-                if match_text in p.text:
-                    # Highlight all runs in that paragraph
-                    # If no runs, create one (shouldn't normally happen)
-                    if not p.runs:
-                        run = p.add_run(p.text)
-                        run.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                    else:
-                        for run in p.runs:
-                            try:
-                                run.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                            except Exception:
-                                # ignore runs that cannot be highlighted
-                                pass
-                    # Append anchor
-                    p.add_run(f" [ISSUE #{issue_counter}]")
-                    found = True
-                    break
-        if not found:
+    # Resolve every issue to a paragraph first, then apply all highlights and
+    # anchors in one pass over the matched paragraphs
+    targets = resolve_issue_paragraphs(review_doc, issues)
+    anchors = {}
+    for issue_number, pi in enumerate(targets, start=1):
+        if pi is not None:
+            anchors.setdefault(pi, []).append(issue_number)
+
+    for pi in sorted(anchors):
+        p = paragraphs[pi]
+        # Highlight all runs in that paragraph
+        # If no runs, create one (shouldn't normally happen)
+        if not p.runs:
+            run = p.add_run(p.text)
+            run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+        else:
+            for run in p.runs:
+                try:
+                    run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+                except Exception:
+                    # ignore runs that cannot be highlighted
+                    pass
+        # Append anchors
+        for issue_number in anchors[pi]:
+            p.add_run(f" [ISSUE #{issue_number}]")
+
+    for issue_number, (iss, pi) in enumerate(zip(issues, targets), start=1):
+        if pi is None:
             # If no matching paragraph found, append a short note at the end
-            appended = doc.add_paragraph(f"[ISSUE #{issue_counter}] (original text not found in body): {match_text[:200]}")
+            match_text = iss.get("match_text", "")
+            where = _issue_location(review_doc, iss)
+            note = f"(in {where})" if where else "(original text not found in body)"
+            appended = add_paragraph(f"[ISSUE #{issue_number}] {note}: {match_text[:200]}")
             # highlight note to make it visible
             for run in appended.runs:
                 try:
                     run.font.highlight_color = WD_COLOR_INDEX.YELLOW
                 except Exception:
                     pass
-        issue_counter += 1
 
     # Append issues appendix. Use safe fallback for Heading style absence.
     doc.add_page_break()
@@ -98,15 +336,20 @@ def annotate_and_save(original_path: str,
     # Write out each issue in structured manner
     idx = 1
     for iss in issues:
-        p = doc.add_paragraph()
+        p = add_paragraph()
         p.add_run(f"ISSUE #{idx}: ").bold = True
         p.add_run(iss.get("issue_text", "No issue text provided"))
-        doc.add_paragraph(f"Matched text (excerpt): {iss.get('match_text', '')[:400]}")
-        doc.add_paragraph(f"Severity: {iss.get('severity', 'Medium')}")
-        doc.add_paragraph(f"Suggestion: {iss.get('suggestion', '')}")
-        doc.add_paragraph(f"Citation: {iss.get('citation', '') or 'Pending — retrieve ADGM references'}")
-        doc.add_paragraph("")  # spacer
+        add_paragraph(f"Matched text (excerpt): {iss.get('match_text', '')[:400]}")
+        add_paragraph(f"Severity: {iss.get('severity', 'Medium')}")
+        add_paragraph(f"Suggestion: {iss.get('suggestion', '')}")
+        add_paragraph(f"Citation: {iss.get('citation', '') or 'Pending — retrieve ADGM references'}")
+        add_paragraph("")  # spacer
         idx += 1
+    return doc
 
+def annotate_and_save(original_path: Union[str, ReviewDocument],
+                      issues: List[Dict],
+                      output_path: str):
+    """Annotate the original .docx as annotate_document() does and save it to output_path."""
     # Save reviewed document
-    doc.save(output_path)
+    annotate_document(original_path, issues).save(output_path)
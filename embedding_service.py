@@ -0,0 +1,129 @@
+# embedding_service.py
+# Micro-batching front end for the shared SentenceTransformer. Encode requests
+# from every session are queued; a single worker thread collects them for up
+# to max_wait_ms (or until max_batch_size texts), runs one forward pass and
+# resolves each caller's future with its own rows.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Upper bounds of the batch-size histogram buckets (texts per forward pass)
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class EmbeddingService:
+    def __init__(self, model_loader, max_batch_size=64, max_wait_ms=5.0):
+        """model_loader() returns the model; it is called once, on the worker thread."""
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._carry = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._texts = 0
+        self._max_queue_depth = 0
+        self._histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def configure(self, max_batch_size=None, max_wait_ms=None):
+        """Tune the batching window; takes effect from the next batch."""
+        if max_batch_size is not None:
+            self.max_batch_size = max_batch_size
+        if max_wait_ms is not None:
+            self.max_wait_ms = max_wait_ms
+
+    def submit(self, texts):
+        """Queue texts for encoding; the Future resolves to an (n, dim) array."""
+        fut = Future()
+        texts = list(texts)
+        if not texts:
+            fut.set_result(np.zeros((0, 0), dtype="float32"))
+            return fut
+        self._ensure_started()
+        self._queue.put((texts, fut))
+        with self._stats_lock:
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return fut
+
+    def encode(self, texts, timeout=None):
+        """Blocking encode through the shared batcher."""
+        return self.submit(texts).result(timeout)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes."""
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                # Keep it for the next batch rather than overshoot this one
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, size
+
+    def _run(self):
+        model = None
+        while True:
+            batch, size = self._collect()
+            texts = [t for item, _ in batch for t in item]
+            try:
+                if model is None:
+                    model = self.model_loader()
+                vecs = model.encode(texts, convert_to_numpy=True)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self._record(size)
+            start = 0
+            for item, fut in batch:
+                fut.set_result(vecs[start:start + len(item)])
+                start += len(item)
+
+    def _record(self, size):
+        bucket = next((i for i, b in enumerate(HISTOGRAM_BUCKETS) if size <= b), len(HISTOGRAM_BUCKETS))
+        with self._stats_lock:
+            self._batches += 1
+            self._texts += size
+            self._histogram[bucket] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            labels = [f"<={b}" for b in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]}"]
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "texts": self._texts,
+                "mean_batch_size": self._texts / self._batches if self._batches else 0.0,
+                "queue_depth": self._queue.qsize() + (1 if self._carry else 0),
+                "max_queue_depth": self._max_queue_depth,
+                "batch_size_histogram": dict(zip(labels, self._histogram)),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+            }
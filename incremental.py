@@ -0,0 +1,88 @@
+# incremental.py
+# Paragraph-level re-review of a document lineage (successive versions of the
+# same document, keyed by file name or a caller-supplied id). The last review
+# of each lineage keeps one fingerprint and one rule-scan hit set per
+# paragraph, plus its cited issues; a new version is diffed against it so only
+# inserted or modified paragraphs are re-detected and re-cited.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+
+from citation_cache import normalize_text
+
+
+def fingerprint(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def match_paragraphs(old_fps, new_fps):
+    """Map new paragraph index -> old index for every paragraph left unchanged."""
+    mapping = {}
+    matcher = SequenceMatcher(None, old_fps, new_fps, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for k in range(i2 - i1):
+                mapping[j1 + k] = i1 + k
+    return mapping
+
+
+def carry_forward(old_issues, mapping, texts, rule_ids):
+    """
+    Copy the old issues of the given (paragraph-scope) rules that sit on
+    unchanged paragraphs, with para_index and match_text moved to the new
+    version. Citations are kept only when they came from the index
+    (review.format_citation's "Source: ..." form); placeholders and failed
+    lookups are cleared so the citation step retries them.
+    """
+    old_to_new = {old: new for new, old in mapping.items()}
+    carried = []
+    for iss in old_issues:
+        new = old_to_new.get(iss.get("para_index"))
+        if new is None or iss.get("rule") not in rule_ids:
+            continue
+        iss = dict(iss, para_index=new, match_text=texts[new])
+        if not iss.get("citation", "").startswith("Source:"):
+            iss["citation"] = ""
+        carried.append(iss)
+    return carried
+
+
+class LineageStore:
+    """Last reviewed state per lineage id, in SQLite. Entries reviewed under a
+    different version (rules + index) are ignored and overwritten."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS lineages ("
+            "lineage_id TEXT PRIMARY KEY, version TEXT, fingerprints TEXT, "
+            "hits TEXT, issues TEXT, updated REAL)"
+        )
+        self._db.commit()
+
+    def get(self, lineage_id, version):
+        """Return (fingerprints, hits, issues) from the last review, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprints, hits, issues FROM lineages WHERE lineage_id = ? AND version = ?",
+                (lineage_id, version),
+            ).fetchone()
+        if row is None:
+            return None
+        fps, hits, issues = (json.loads(v) for v in row)
+        return fps, [set(h) for h in hits], issues
+
+    def put(self, lineage_id, version, fingerprints, hits, issues):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO lineages VALUES (?, ?, ?, ?, ?, ?)",
+                (lineage_id, version, json.dumps(fingerprints),
+                 json.dumps([sorted(h) for h in hits]), json.dumps(issues), time.time()),
+            )
+            self._db.commit()
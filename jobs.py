@@ -0,0 +1,150 @@
+# jobs.py
+# In-process queue for review jobs: bounded concurrency, backpressure when too
+# many jobs are waiting, and per-file stage progress the UI can stream.
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from metrics import METRICS, profiled
+from review import READY, build_report, process_docs, reviewed_path
+
+# Opt-in per-job profiles (JobQueue.submit(..., profile=True)) are written here;
+# REVIEW_PROFILER=pyinstrument uses pyinstrument when it is installed
+PROFILE_DIR = os.environ.get("REVIEW_PROFILE_DIR", "profiles")
+PROFILER = os.environ.get("REVIEW_PROFILER", "cprofile")
+
+STAGES = ("parsed", "detected", "cited", "annotated")
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already queued or running."""
+
+class ReviewJob:
+    def __init__(self, files, process_choice, profile=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.file_paths = [f.name if hasattr(f, "name") else f for f in files]
+        self.process_choice = process_choice
+        self.profile = profile
+        self.status = "queued"
+        self.stages = OrderedDict((os.path.basename(p), None) for p in self.file_paths)
+        self.events = 0
+        self.report = None
+        self.reviewed_files = []
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def _update(self, **fields):
+        with self._cond:
+            for k, v in fields.items():
+                setattr(self, k, v)
+            self.events += 1
+            self._cond.notify_all()
+
+    def _on_progress(self, file_path, stage):
+        with self._cond:
+            self.stages[os.path.basename(file_path)] = stage
+            self.events += 1
+            self._cond.notify_all()
+
+    def wait_for_update(self, seen, timeout=None):
+        """Block until an event newer than `seen` arrives; returns the event count."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.events > seen or self.done, timeout)
+            return self.events
+
+    def progress(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "files": dict(self.stages),
+                "completed": sum(1 for s in self.stages.values() if s == STAGES[-1]),
+                "total": len(self.stages),
+                # False while the index and model are still warming up; the
+                # job then waits at the citation stage
+                "index_ready": READY.is_set(),
+            }
+
+    def result(self):
+        """Progress snapshot, plus the report (or error) once the job is done."""
+        out = self.progress()
+        if self.status == "done":
+            out["report"] = self.report
+        elif self.status == "failed":
+            out["error"] = self.error
+        return out
+
+class JobQueue:
+    """
+    Runs at most max_concurrent reviews at a time on background threads.
+    Submitting while max_pending jobs are queued or running raises QueueFull
+    instead of letting the backlog grow without bound. Finished jobs stay
+    fetchable by id until keep_finished newer ones have completed.
+    """
+    def __init__(self, max_concurrent=2, max_pending=8, keep_finished=100):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="review-job")
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, files, process_choice, profile=False):
+        """Queue a review; with profile=True the job runs under profiled()."""
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise QueueFull(f"Review queue is full ({self._active} jobs pending); try again shortly.")
+            job = ReviewJob(files, process_choice, profile)
+            self._jobs[job.id] = job
+            self._active += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job._update(status="running")
+        METRICS.inc("reviews_total", help="Review jobs started.")
+        METRICS.inc("review_files_total", len(job.file_paths), help="Files submitted for review.")
+        try:
+            stats = {}
+            with (profiled(job.id, PROFILE_DIR, PROFILER) if job.profile else nullcontext()) as profile:
+                checklist, issues = process_docs(job.file_paths, job.process_choice,
+                                                 progress=job._on_progress, stats=stats)
+            report = build_report(checklist, issues, stats)
+            if profile is not None:
+                report["profile"] = profile
+            reviewed = [reviewed_path(p) for p in job.file_paths if os.path.exists(reviewed_path(p))]
+            job._update(report=report, reviewed_files=reviewed, status="done", finished=time.time())
+        except Exception as e:
+            METRICS.inc("review_failures_total", help="Review jobs that failed.")
+            job._update(error=f"{type(e).__name__}: {e}", status="failed", finished=time.time())
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._evict()
+
+    def _evict(self):
+        finished = [jid for jid, j in self._jobs.items() if j.done]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.status == "running")
+            queued = sum(1 for j in self._jobs.values() if j.status == "queued")
+        return {"running": running, "queued": queued,
+                "max_concurrent": self.max_concurrent, "max_pending": self.max_pending}
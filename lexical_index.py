@@ -0,0 +1,138 @@
+# lexical_index.py
+# Compact BM25 inverted index over the RAG chunks. Flagged clauses often quote
+# regulation wording almost verbatim, which a lexical match finds without a
+# transformer forward pass. Postings are flat arrays (CSR layout), written next
+# to the native index and memory-mapped like the vectors:
+#   bm25_terms.json    vocabulary (in posting-row order), k1 and b
+#   bm25_offsets.npy   int64 start of each term's postings (n_terms + 1 entries)
+#   bm25_docs.npy      int32 chunk ids, ascending within a term
+#   bm25_tf.npy        uint16 term frequency of each posting
+#   bm25_lengths.npy   int32 tokens per chunk
+
+import json
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+LEXICAL_FILES = {
+    "terms": "bm25_terms.json",
+    "offsets": "bm25_offsets.npy",
+    "docs": "bm25_docs.npy",
+    "tf": "bm25_tf.npy",
+    "lengths": "bm25_lengths.npy",
+}
+K1 = 1.2
+B = 0.75
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def has_lexical_index(path):
+    return os.path.exists(os.path.join(path, LEXICAL_FILES["terms"]))
+
+
+class LexicalIndex:
+    """BM25 over a fixed list of chunks; search() also reports how much of the
+    query the best chunk covers, which is what the citation fast path keys on."""
+
+    def __init__(self, terms, offsets, docs, tf, lengths, k1=K1, b=B):
+        self.terms = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tf = tf
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(lengths)
+        self.avgdl = float(np.mean(lengths)) if self.n_docs else 0.0
+        df = np.diff(np.asarray(offsets)).astype("float32")
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        # idf of a term no chunk contains; counts against coverage
+        self.unseen_idf = float(np.log1p((self.n_docs + 0.5) / 0.5))
+
+    @classmethod
+    def build(cls, chunks, k1=K1, b=B):
+        """Index a sequence of chunk texts (a list or a ChunkStore)."""
+        postings = {}
+        lengths = np.zeros(len(chunks), dtype="int32")
+        for i in range(len(chunks)):
+            counts = Counter(tokenize(chunks[i]))
+            lengths[i] = sum(counts.values())
+            for term, n in counts.items():
+                p = postings.get(term)
+                if p is None:
+                    p = postings[term] = (array("i"), array("H"))
+                p[0].append(i)
+                p[1].append(min(n, 65535))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        offsets[1:] = np.cumsum([len(postings[t][0]) for t in terms])
+        docs = np.empty(offsets[-1], dtype="int32")
+        tf = np.empty(offsets[-1], dtype="uint16")
+        for row, term in enumerate(terms):
+            d, f = postings.pop(term)
+            docs[offsets[row]:offsets[row + 1]] = np.frombuffer(d, dtype="int32")
+            tf[offsets[row]:offsets[row + 1]] = np.frombuffer(f, dtype="uint16")
+        return cls(terms, offsets, docs, tf, lengths, k1, b)
+
+    def save(self, out_dir):
+        with open(os.path.join(out_dir, LEXICAL_FILES["terms"]), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.vocabulary(), "k1": self.k1, "b": self.b}, f)
+        for name in ("offsets", "docs", "tf", "lengths"):
+            np.save(os.path.join(out_dir, LEXICAL_FILES[name]), getattr(self, name))
+
+    @classmethod
+    def load(cls, path):
+        """Open an index saved by save(); the posting arrays are memory-mapped."""
+        with open(os.path.join(path, LEXICAL_FILES["terms"]), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, LEXICAL_FILES[name]), mmap_mode="r")
+                  for name in ("offsets", "docs", "tf", "lengths")}
+        return cls(meta["terms"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    def to_dict(self):
+        """Plain arrays for the legacy pickle format."""
+        return {"terms": self.vocabulary(), "k1": self.k1, "b": self.b,
+                **{name: np.asarray(getattr(self, name)) for name in ("offsets", "docs", "tf", "lengths")}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def vocabulary(self):
+        return sorted(self.terms, key=self.terms.get)
+
+    def search(self, text, k=3):
+        """
+        Top-k chunks for a query text. Returns (ids, scores, coverage):
+        coverage is the idf-weighted share of the query's distinct terms that
+        occur in the best chunk, 1.0 for a verbatim quote.
+        """
+        query = list(dict.fromkeys(tokenize(text)))
+        rows = [self.terms[t] for t in query if t in self.terms]
+        if not rows or not self.n_docs:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32"), 0.0
+        total_idf = float(self.idf[rows].sum()) + self.unseen_idf * (len(query) - len(rows))
+        spans = [(int(self.offsets[r]), int(self.offsets[r + 1])) for r in rows]
+        docs = np.concatenate([self.docs[s:e] for s, e in spans])
+        tf = np.concatenate([self.tf[s:e] for s, e in spans]).astype("float32")
+        idf = np.repeat(self.idf[rows], [e - s for s, e in spans])
+        norm = self.k1 * (1.0 - self.b + self.b * self.lengths[docs] / max(self.avgdl, 1e-9))
+        scores = np.bincount(docs, weights=idf * tf * (self.k1 + 1.0) / (tf + norm), minlength=self.n_docs)
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        # A term has at most one posting per chunk, so this is the matched idf of the best chunk
+        matched = float(idf[docs == top[0]].sum())
+        coverage = matched / total_idf if total_idf else 0.0
+        return top.astype("int64"), scores[top].astype("float32"), coverage
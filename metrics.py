@@ -0,0 +1,211 @@
+# metrics.py
+# Lightweight span timing for the review pipeline and the index build.
+# span("stage") adds its duration to the run being collected (collect()) and
+# to the process-wide histograms that serve_metrics() exposes in Prometheus
+# text format. profiled() dumps a cProfile (or pyinstrument) report for one
+# opt-in request.
+
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the stage-duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "adgm"
+
+
+class Timings:
+    """Seconds and call count per stage for one run."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, count=1):
+        with self._lock:
+            total, n = self._stages.get(stage, (0.0, 0))
+            self._stages[stage] = (total + seconds, n + count)
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: {"seconds": round(total, 6), "count": n}
+                    for stage, (total, n) in self._stages.items()}
+
+
+class Registry:
+    """Process-wide counters, gauges and per-stage duration histograms."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            h = self._histograms.get(stage)
+            if h is None:
+                h = self._histograms[stage] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, b in enumerate(self.buckets):
+                if seconds <= b:
+                    h["buckets"][i] += 1
+            h["sum"] += seconds
+            h["count"] += 1
+
+    def inc(self, name, value=1, help=""):
+        with self._lock:
+            current, _ = self._counters.get(name, (0, help))
+            self._counters[name] = (current + value, help)
+
+    def register_gauge(self, name, fn, help=""):
+        """fn() is called at scrape time and returns the gauge's current value."""
+        with self._lock:
+            self._gauges[name] = (fn, help)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {k: dict(v, buckets=list(v["buckets"])) for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        out = []
+        name = f"{PREFIX}_stage_seconds"
+        out.append(f"# HELP {name} Duration of pipeline stages.")
+        out.append(f"# TYPE {name} histogram")
+        for stage, h in sorted(histograms.items()):
+            for b, n in zip(self.buckets, h["buckets"]):
+                out.append(f'{name}_bucket{{stage="{stage}",le="{b}"}} {n}')
+            out.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+            out.append(f'{name}_sum{{stage="{stage}"}} {h["sum"]}')
+            out.append(f'{name}_count{{stage="{stage}"}} {h["count"]}')
+        for cname, (value, help) in sorted(counters.items()):
+            out.append(f"# HELP {PREFIX}_{cname} {help}")
+            out.append(f"# TYPE {PREFIX}_{cname} counter")
+            out.append(f"{PREFIX}_{cname} {value}")
+        for gname, (fn, help) in sorted(gauges.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            out.append(f"# HELP {PREFIX}_{gname} {help}")
+            out.append(f"# TYPE {PREFIX}_{gname} gauge")
+            out.append(f"{PREFIX}_{gname} {value}")
+        return "\n".join(out) + "\n"
+
+
+METRICS = Registry()
+_CURRENT = contextvars.ContextVar("timings", default=None)
+
+
+@contextmanager
+def collect():
+    """Collect the spans of the enclosed block (on this thread) into a new Timings."""
+    timings = Timings()
+    token = _CURRENT.set(timings)
+    try:
+        yield timings
+    finally:
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def span(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+
+def record(stage, seconds, count=1):
+    """Add an already measured duration, as span() does."""
+    METRICS.observe(stage, seconds)
+    current = _CURRENT.get()
+    if current is not None:
+        current.add(stage, seconds, count)
+
+
+def replay(timings):
+    """Record the as_dict() output of a run collected elsewhere, e.g. in a pool worker."""
+    for stage, t in (timings or {}).items():
+        record(stage, t["seconds"], t["count"])
+
+
+_PROFILE_LOCK = threading.Lock()
+
+
+@contextmanager
+def profiled(name, out_dir, mode="cprofile"):
+    """
+    Profile the enclosed block on the calling thread and dump the report to
+    out_dir/<name>.prof (plus a .txt summary) for cProfile, or <name>.html
+    for pyinstrument. Yields a dict whose 'path' is set once the dump is
+    written; only one profile runs at a time, later ones are skipped.
+    Work done on other threads (e.g. the embedding service) is not included.
+    """
+    info = {"mode": mode, "path": None}
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        info["skipped"] = "another request is being profiled"
+        yield info
+        return
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        if mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                info["mode"] = mode = "cprofile"
+        if mode == "pyinstrument":
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield info
+        finally:
+            if mode == "pyinstrument":
+                profiler.stop()
+                info["path"] = os.path.join(out_dir, f"{name}.html")
+                with open(info["path"], "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.disable()
+                info["path"] = os.path.join(out_dir, f"{name}.prof")
+                profiler.dump_stats(info["path"])
+                text = io.StringIO()
+                pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(40)
+                with open(os.path.join(out_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                    f.write(text.getvalue())
+    finally:
+        _PROFILE_LOCK.release()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve METRICS at http://host:port/metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
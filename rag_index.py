@@ -1,13 +1,467 @@
 # rag_index.py
+import json
+import mmap
+import os
 import pickle
+import threading
+import time
 import numpy as np
 
+from lexical_index import LexicalIndex, has_lexical_index, tokenize
+
+# Native on-disk layout (a directory):
+#   index.faiss   FAISS index written with faiss.write_index, opened with mmap
+#   chunks.bin    all chunk texts, UTF-8, concatenated
+#   offsets.npy   int64 byte offsets into chunks.bin (n_chunks + 1 entries)
+#   chunk_meta.npy  int32 (url_id, chunk_index) per chunk
+#   vectors.npy   float32 full-precision vectors (exact re-ranking, incremental rebuilds)
+#   meta.json     dimension, model, index_version, index_params and the url table
+#   bm25_*        optional BM25 inverted index over the chunks (lexical_index.py)
+NATIVE_FILES = {
+    "index": "index.faiss",
+    "chunks": "chunks.bin",
+    "offsets": "offsets.npy",
+    "chunk_meta": "chunk_meta.npy",
+    "vectors": "vectors.npy",
+    "meta": "meta.json",
+}
+EXCERPT_CHARS = 300
+# Rows handed to FAISS per add() call and the cap on training points, so an
+# index can be built from a memory-mapped vectors file in bounded memory
+ADD_BATCH = 65536
+MAX_TRAIN = 100000
+
+# ANN index types selectable at build time, with their default tunables.
+# Build-time knobs (M, nlist) shape the index; search-time knobs (efSearch,
+# nprobe) are persisted alongside it and applied whenever it is loaded.
+INDEX_TYPES = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 80, "efSearch": 64},
+    "ivf": {"nlist": 1024, "nprobe": 16},
+}
+
+# Retrieval modes of RagIndex.query_texts. "hybrid" answers a text from the
+# BM25 index alone when its best chunk covers at least LEXICAL_MIN_COVERAGE of
+# the query terms; other texts are embedded and the dense and lexical rankings
+# fused by reciprocal rank (RRF_K), each ranking FUSE_DEPTH candidates deep.
+RETRIEVAL_MODES = ("dense", "hybrid")
+LEXICAL_MIN_COVERAGE = 0.9
+LEXICAL_MIN_TERMS = 4
+FUSE_DEPTH = 20
+RRF_K = 60
+
+# Compressed vector storage. A quantized index only ranks candidates: the top
+# rerank_k hits are re-scored exactly against the full-precision vectors.
+QUANTIZERS = {
+    "none": {},
+    "sq8": {"rerank_k": 50},
+    "pq": {"pq_m": 16, "pq_nbits": 8, "rerank_k": 50},
+}
+
+
+def build_faiss_index(vectors, index_type="flat", quantizer="none", **params):
+    """Build a FAISS index over `vectors` and return (index, index_params).
+    index_params records the type and every tunable so it can be persisted.
+    `vectors` may be a memory-mapped array; it is trained on a sample and
+    added in ADD_BATCH slices rather than copied whole.
+    """
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; choose from {sorted(INDEX_TYPES)}")
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer {quantizer!r}; choose from {sorted(QUANTIZERS)}")
+    x = np.ascontiguousarray(vectors, dtype="float32")
+    dim = x.shape[1]
+    opts = dict(INDEX_TYPES[index_type])
+    opts.update(QUANTIZERS[quantizer])
+    opts.update({k: v for k, v in params.items() if k in opts and v is not None})
+    if index_type == "ivf":
+        # IVF needs at least one training point per list
+        opts["nlist"] = max(1, min(opts["nlist"], len(x)))
+
+    if quantizer != "none":
+        if quantizer == "pq":
+            if dim % opts["pq_m"]:
+                raise ValueError(f"pq_m={opts['pq_m']} must divide the dimension {dim}")
+            # k-means needs at least 2**nbits training points per sub-quantizer
+            opts["pq_nbits"] = max(1, min(opts["pq_nbits"], int(np.log2(max(len(x), 2)))))
+            codec = f"PQ{opts['pq_m']}x{opts['pq_nbits']}"
+        else:
+            codec = "SQ8"
+        prefix = {"flat": "", "hnsw": f"HNSW{opts.get('M')},", "ivf": f"IVF{opts.get('nlist')},"}
+        index = faiss.index_factory(dim, prefix[index_type] + codec)
+        if index_type == "hnsw":
+            faiss.downcast_index(index).hnsw.efConstruction = opts["efConstruction"]
+        index.train(_training_sample(x))
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, opts["M"])
+        index.hnsw.efConstruction = opts["efConstruction"]
+    elif index_type == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, opts["nlist"])
+        index.train(_training_sample(x))
+    else:
+        index = faiss.IndexFlatL2(dim)
+    for start in range(0, len(x), ADD_BATCH):
+        index.add(np.ascontiguousarray(x[start:start + ADD_BATCH]))
+
+    index_params = {"type": index_type, "quantizer": quantizer, **opts}
+    apply_search_params(index, index_params)
+    return index, index_params
+
+
+def rerank_exact(queries, candidates, vectors, k):
+    """Re-score candidate ids exactly (squared L2) against full-precision vectors.
+    Returns (D, I) shaped (n_queries, k), padded with inf / -1 like FAISS.
+    """
+    D = np.full((len(queries), k), np.inf, dtype="float32")
+    I = np.full((len(queries), k), -1, dtype="int64")
+    for row, (q, cand) in enumerate(zip(queries, candidates)):
+        # Sorted ids keep reads from a memory-mapped vectors file sequential
+        cand = np.sort(cand[cand >= 0])
+        if not len(cand):
+            continue
+        d = ((np.asarray(vectors[cand]) - q) ** 2).sum(axis=1)
+        order = np.argsort(d)[:k]
+        D[row, :len(order)] = d[order]
+        I[row, :len(order)] = cand[order]
+    return D, I
+
+
+def exact_knn(queries, vectors, k):
+    """Brute-force k nearest rows (squared L2), scanning vectors in ADD_BATCH
+    slices so a memory-mapped matrix is never copied whole."""
+    import faiss
+
+    D = np.full((len(queries), k), np.inf, dtype="float32")
+    I = np.full((len(queries), k), -1, dtype="int64")
+    for start in range(0, len(vectors), ADD_BATCH):
+        block = np.ascontiguousarray(vectors[start:start + ADD_BATCH], dtype="float32")
+        d, i = faiss.knn(queries, block, min(k, len(block)))
+        D = np.concatenate([D, d], axis=1)
+        I = np.concatenate([I, i + start], axis=1)
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        D = np.take_along_axis(D, order, axis=1)
+        I = np.take_along_axis(I, order, axis=1)
+    return D, I
+
+
+def compression_report(index, vectors, index_params, k=2, n_queries=200, seed=0):
+    """Bytes per vector and recall@k of the compressed index, with and without
+    exact re-ranking, against brute force on a sample of the corpus.
+    vectors may be memory-mapped: only the sampled rows and one ADD_BATCH
+    slice at a time are read into memory.
+    """
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False))
+    q = np.asarray(vectors[rows], dtype="float32")
+    q = np.ascontiguousarray(q + 0.01 * rng.standard_normal(q.shape).astype("float32"))
+    k = min(k, len(vectors))
+    _, truth = exact_knn(q, vectors, k)
+
+    def recall(found):
+        return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+    _, coarse = index.search(q, k)
+    _, cand = index.search(q, max(k, int(index_params.get("rerank_k", k))))
+    _, reranked = rerank_exact(q, cand, vectors, k)
+    return {
+        "bytes_per_vector": len(faiss.serialize_index(index)) / max(index.ntotal, 1),
+        "float32_bytes_per_vector": vectors.shape[1] * 4,
+        f"recall@{k}_compressed": recall(coarse),
+        f"recall@{k}_reranked": recall(reranked),
+        # Brute force is what a flat index returns, so this is the loss against one
+        "recall_loss_vs_exact": 1.0 - recall(reranked),
+    }
+
+
+def _training_sample(x, seed=0):
+    if len(x) <= MAX_TRAIN:
+        return np.ascontiguousarray(x)
+    rows = np.sort(np.random.default_rng(seed).choice(len(x), MAX_TRAIN, replace=False))
+    return np.ascontiguousarray(x[rows])
+
+
+def apply_search_params(index, index_params):
+    """Apply persisted search-time tunables (efSearch / nprobe) to an index."""
+    import faiss
+
+    if not index_params:
+        return index
+    if index_params.get("type") == "hnsw" and "efSearch" in index_params:
+        faiss.downcast_index(index).hnsw.efSearch = int(index_params["efSearch"])
+    elif index_params.get("type") == "ivf" and "nprobe" in index_params:
+        faiss.extract_index_ivf(index).nprobe = int(index_params["nprobe"])
+    return index
+
+
+class ChunkStore:
+    """Read-only sequence of chunk texts backed by a memory-mapped blob."""
+
+    def __init__(self, blob_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+
+class MetadataStore:
+    """Per-chunk metadata dicts rebuilt on access from compact arrays.
+    The excerpt is sliced from the chunk text instead of being stored twice.
+    """
+
+    def __init__(self, urls, chunk_meta, chunks):
+        self.urls = urls
+        self.chunk_meta = chunk_meta
+        self.chunks = chunks
+
+    def __len__(self):
+        return len(self.chunk_meta)
+
+    def __getitem__(self, i):
+        url_id, chunk_index = self.chunk_meta[i]
+        return {
+            "url": self.urls[int(url_id)],
+            "chunk_index": int(chunk_index),
+            "excerpt": self.chunks[i][:EXCERPT_CHARS],
+        }
+
+
+class NativeIndexWriter:
+    """Append-only writer for the native layout.
+
+    Rows are streamed to chunks.bin and to raw *.part files so a build runs in
+    bounded memory; finish() turns the parts into the final .npy files. A
+    writer reopened with the row count of its last flush() truncates anything
+    written after it, which is what lets an interrupted build resume.
+    """
+
+    PARTS = {"offsets": ("offsets.i64.part", "int64"),
+             "chunk_meta": ("chunk_meta.i32.part", "int32"),
+             "vectors": ("vectors.f32.part", "float32")}
+
+    def __init__(self, out_dir, rows=0, dimension=None, urls=None):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.rows = rows
+        self.dimension = dimension
+        self.urls = {u: i for i, u in enumerate(urls or [])}
+        self.bytes = 0
+        if rows:
+            ends = np.fromfile(self._path("offsets"), dtype="int64", count=rows)
+            self.bytes = int(ends[-1])
+        sizes = {"chunks": self.bytes, "offsets": rows * 8, "chunk_meta": rows * 8,
+                 "vectors": rows * 4 * (dimension or 0)}
+        self._files = {}
+        for name, size in sizes.items():
+            f = open(self._path(name), "r+b" if rows else "wb")
+            f.truncate(size)
+            f.seek(size)
+            self._files[name] = f
+
+    def _path(self, name):
+        if name == "chunks":
+            return os.path.join(self.out_dir, NATIVE_FILES["chunks"])
+        return os.path.join(self.out_dir, self.PARTS[name][0])
+
+    def append(self, chunks, metadata, vectors=None):
+        """Append rows; metadata dicts need 'url' and 'chunk_index'."""
+        ends = np.empty(len(chunks), dtype="int64")
+        for i, ch in enumerate(chunks):
+            b = ch.encode("utf-8")
+            self._files["chunks"].write(b)
+            self.bytes += len(b)
+            ends[i] = self.bytes
+        self._files["offsets"].write(ends.tobytes())
+
+        meta = np.empty((len(metadata), 2), dtype="int32")
+        for i, m in enumerate(metadata):
+            meta[i, 0] = self.urls.setdefault(m["url"], len(self.urls))
+            meta[i, 1] = m.get("chunk_index", 0)
+        self._files["chunk_meta"].write(meta.tobytes())
+
+        if vectors is not None and len(chunks):
+            v = np.ascontiguousarray(vectors, dtype="float32")
+            self.dimension = v.shape[1]
+            self._files["vectors"].write(v.tobytes())
+        self.rows += len(chunks)
+
+    def flush(self):
+        """Make every appended row durable; the state to reopen with is state()."""
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def state(self):
+        return {"rows": self.rows, "dimension": self.dimension, "urls": list(self.urls)}
+
+    def vectors(self):
+        """Memory-mapped view of the vectors appended so far."""
+        self.flush()
+        if not self.rows or not self.dimension:
+            return np.zeros((0, self.dimension or 0), dtype="float32")
+        return np.memmap(self._path("vectors"), dtype="float32", mode="r",
+                         shape=(self.rows, self.dimension))
+
+    def _part_to_npy(self, name, shape, prefix=None):
+        part, dtype = self.PARTS[name]
+        rows = shape[0] - (len(prefix) if prefix is not None else 0)
+        if not rows:
+            np.save(os.path.join(self.out_dir, NATIVE_FILES[name]),
+                    prefix if prefix is not None else np.zeros(shape, dtype=dtype))
+            os.remove(self._path(name))
+            return
+        out = np.lib.format.open_memmap(os.path.join(self.out_dir, NATIVE_FILES[name]),
+                                        mode="w+", dtype=dtype, shape=shape)
+        start = 0
+        if prefix is not None:
+            out[:len(prefix)] = prefix
+            start = len(prefix)
+        if rows:
+            src = np.memmap(self._path(name), dtype=dtype, mode="r", shape=(rows,) + shape[1:])
+            for i in range(0, rows, ADD_BATCH):
+                out[start + i:start + i + ADD_BATCH] = src[i:i + ADD_BATCH]
+            del src
+        out.flush()
+        del out
+        os.remove(self._path(name))
+
+    def finish(self, index, dimension=None, model=None, index_version=None,
+               index_params=None, compression=None, keep_vectors=True):
+        """Write the FAISS index and meta.json and finalize the part files."""
+        import faiss
+
+        for f in self._files.values():
+            f.close()
+        dimension = dimension or self.dimension
+        faiss.write_index(index, os.path.join(self.out_dir, NATIVE_FILES["index"]))
+        self._part_to_npy("offsets", (self.rows + 1,), prefix=np.zeros(1, dtype="int64"))
+        self._part_to_npy("chunk_meta", (self.rows, 2))
+        if keep_vectors and self.dimension:
+            self._part_to_npy("vectors", (self.rows, self.dimension))
+        elif os.path.exists(self._path("vectors")):
+            os.remove(self._path("vectors"))
+
+        with open(os.path.join(self.out_dir, NATIVE_FILES["meta"]), "w", encoding="utf-8") as f:
+            json.dump({
+                "dimension": int(dimension),
+                "model": model,
+                "index_version": index_version,
+                "index_params": index_params or {"type": "flat"},
+                "n_chunks": self.rows,
+                "compression": compression,
+                "urls": list(self.urls),
+            }, f)
+
+
+def write_native_index(out_dir, index, chunks, metadata, dimension, model=None, index_version=None,
+                       index_params=None, vectors=None, compression=None):
+    """Write an index in the native directory layout read by RagIndex.load."""
+    writer = NativeIndexWriter(out_dir)
+    writer.append(chunks, metadata, vectors)
+    writer.finish(index, dimension=dimension, model=model, index_version=index_version,
+                  index_params=index_params, compression=compression,
+                  keep_vectors=vectors is not None)
+
+
+def convert_pickle(pkl_path, out_dir):
+    """One-shot conversion of a legacy pickle index to the native layout."""
+    with open(pkl_path, "rb") as f:
+        data = pickle.load(f)
+    st = os.stat(pkl_path)
+    write_native_index(
+        out_dir,
+        data["index_flat"],
+        data["chunks"],
+        data["metadata"],
+        data["dimension"],
+        model=data.get("model"),
+        index_version=data.get("index_version") or f"{st.st_size}-{int(st.st_mtime)}",
+        index_params=data.get("index_params"),
+        vectors=data.get("vectors"),
+        compression=data.get("compression"),
+    )
+    if data.get("lexical"):
+        LexicalIndex.from_dict(data["lexical"]).save(out_dir)
+
+
 class RagIndex:
     def __init__(self):
         self.chunks = []
         self.metadata = []
-        self.index = None
         self.dimension = None
+        self.model_name = None
+        self.version = None
+        self.index_params = {"type": "flat"}
+        self.vectors = None
+        self.compression = None
+        self.lexical = None
+        self._index = None
+        self._index_path = None
+        self._lock = threading.Lock()
+        self._retrieval = {"lexical": [0, 0.0], "dense": [0, 0.0]}
+
+    @property
+    def index(self):
+        """FAISS index; a native index is opened (memory-mapped) on first use."""
+        if self._index is None and self._index_path is not None:
+            with self._lock:
+                if self._index is None:
+                    self._index = apply_search_params(self._open_index(self._index_path),
+                                                      self.index_params)
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+
+    @property
+    def loaded(self):
+        """Whether an index has been loaded, without opening a native one."""
+        return self._index is not None or self._index_path is not None
+
+    @staticmethod
+    def _open_index(path):
+        import faiss
+
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            # Index types without mmap support are read into memory
+            return faiss.read_index(path)
+
+    def load(self, path):
+        """Load an index written in the native directory layout.
+        Only meta.json is read eagerly; the FAISS index, chunk text and
+        metadata arrays are memory-mapped so worker processes share pages.
+        """
+        with open(os.path.join(path, NATIVE_FILES["meta"]), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.chunks = ChunkStore(os.path.join(path, NATIVE_FILES["chunks"]),
+                                 os.path.join(path, NATIVE_FILES["offsets"]))
+        chunk_meta = np.load(os.path.join(path, NATIVE_FILES["chunk_meta"]), mmap_mode="r")
+        self.metadata = MetadataStore(meta["urls"], chunk_meta, self.chunks)
+        self.dimension = meta["dimension"]
+        self.model_name = meta.get("model")
+        self.version = meta.get("index_version")
+        self.index_params = meta.get("index_params") or {"type": "flat"}
+        self.compression = meta.get("compression")
+        vectors_path = os.path.join(path, NATIVE_FILES["vectors"])
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        self.lexical = LexicalIndex.load(path) if has_lexical_index(path) else None
+        self._index = None
+        self._index_path = os.path.join(path, NATIVE_FILES["index"])
+        print(f"Loaded RAG index with {len(self.chunks)} chunks.")
 
     def load_from_pickle(self, path):
         """Load FAISS index and metadata from a pickle file."""
@@ -15,18 +469,141 @@ class RagIndex:
             data = pickle.load(f)
         self.chunks = data["chunks"]
         self.metadata = data["metadata"]
+        self.index_params = data.get("index_params") or {"type": "flat"}
         self.index = data["index_flat"]
+        if self.index_params["type"] != "flat":
+            apply_search_params(self.index, self.index_params)
         self.dimension = data["dimension"]
+        self.model_name = data.get("model")
+        self.vectors = data.get("vectors")
+        self.compression = data.get("compression")
+        self.lexical = LexicalIndex.from_dict(data["lexical"]) if data.get("lexical") else None
+        # Older pickles carry no version; fall back to the file's size + mtime
+        st = os.stat(path)
+        self.version = data.get("index_version") or f"{st.st_size}-{int(st.st_mtime)}"
         print(f"Loaded RAG index with {len(self.chunks)} chunks.")
 
+    def set_search_params(self, **params):
+        """Override search-time tunables (efSearch for HNSW, nprobe for IVF, rerank_k)."""
+        self.index_params = {**self.index_params, **params}
+        if self._index is not None:
+            apply_search_params(self._index, self.index_params)
+
     def query(self, vector, k=3):
         """Search for nearest chunks given an embedding vector."""
+        v = np.array(vector, dtype="float32").reshape(1, -1)
+        return self.query_batch(v, k=k)[0]
+
+    def query_batch(self, vectors, k=3):
+        """Search for nearest chunks for every row of an embedding matrix.
+        Runs a single index.search and returns one result list per row.
+        Quantized indexes return rerank_k candidates that are re-ranked exactly.
+        """
+        m = np.ascontiguousarray(vectors, dtype="float32")
+        if m.ndim == 1:
+            m = m.reshape(1, -1)
+        if m.shape[0] == 0:
+            return []
+        D, I = self._search(m, k)
+        return [self._results(D[row], I[row]) for row in range(m.shape[0])]
+
+    def _search(self, m, k):
         if self.index is None:
             raise RuntimeError("Index not loaded.")
-        v = np.array(vector, dtype="float32").reshape(1, -1)
-        D, I = self.index.search(v, k)
+        if self.vectors is not None and self.index_params.get("quantizer", "none") != "none":
+            _, cand = self.index.search(m, max(k, int(self.index_params.get("rerank_k", k))))
+            return rerank_exact(m, cand, self.vectors, k)
+        return self.index.search(m, k)
+
+    def query_texts(self, texts, encode, k=3, mode="hybrid", min_coverage=LEXICAL_MIN_COVERAGE):
+        """
+        Search for raw texts; encode(texts) -> embedding matrix is called at
+        most once, for the texts that need the dense index. In "hybrid" mode
+        (which needs the BM25 index; without it this is "dense") a text of at
+        least LEXICAL_MIN_TERMS terms whose best lexical chunk covers
+        min_coverage of them is answered from the lexical hits alone; the
+        rest are embedded and their dense and lexical rankings fused.
+        Returns (results per text, vectors) with vectors[i] None for texts
+        answered lexically.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; choose from {RETRIEVAL_MODES}")
+        results = [None] * len(texts)
+        vectors = [None] * len(texts)
+        lexical = {}
+        if mode == "hybrid" and self.lexical is not None:
+            for i, text in enumerate(texts):
+                t0 = time.perf_counter()
+                ids, scores, coverage = self.lexical.search(text, max(k, FUSE_DEPTH))
+                if coverage >= min_coverage and len(set(tokenize(text))) >= LEXICAL_MIN_TERMS:
+                    results[i] = self._lexical_results(ids[:k], scores[:k])
+                    self._count("lexical", time.perf_counter() - t0)
+                else:
+                    lexical[i] = (ids, time.perf_counter() - t0)
+        todo = [i for i in range(len(texts)) if results[i] is None]
+        if todo:
+            t0 = time.perf_counter()
+            m = np.ascontiguousarray(encode([texts[i] for i in todo]), dtype="float32")
+            D, I = self._search(m, max(k, FUSE_DEPTH) if lexical else k)
+            for row, i in enumerate(todo):
+                vectors[i] = m[row]
+                if i in lexical:
+                    results[i] = self._fuse(D[row], I[row], lexical[i][0], k)
+                else:
+                    results[i] = self._results(D[row][:k], I[row][:k])
+            per_text = (time.perf_counter() - t0) / len(todo)
+            for i in todo:
+                self._count("dense", per_text + (lexical[i][1] if i in lexical else 0.0))
+        return results, vectors
+
+    def retrieval_stats(self):
+        """How many texts took the lexical fast path and the dense path, with mean latency."""
+        with self._lock:
+            counts = {path: tuple(v) for path, v in self._retrieval.items()}
+        total = sum(n for n, _ in counts.values())
+        out = {"fast_path_rate": counts["lexical"][0] / total if total else 0.0}
+        for path, (n, seconds) in counts.items():
+            out[path] = {"queries": n, "mean_ms": 1000.0 * seconds / n if n else None}
+        return out
+
+    def retrieval_counters(self):
+        """Raw [queries, seconds] per path, for counts kept in another process."""
+        with self._lock:
+            return {path: list(v) for path, v in self._retrieval.items()}
+
+    def merge_retrieval(self, counters):
+        """Add retrieval_counters() recorded elsewhere, e.g. deltas from a pool worker."""
+        with self._lock:
+            for path, (n, seconds) in (counters or {}).items():
+                self._retrieval[path][0] += n
+                self._retrieval[path][1] += seconds
+
+    def _count(self, path, seconds):
+        with self._lock:
+            self._retrieval[path][0] += 1
+            self._retrieval[path][1] += seconds
+
+    def _lexical_results(self, ids, scores):
+        return [{"chunk": self.chunks[idx], "metadata": self.metadata[idx], "distance": None,
+                 "score": float(score), "retrieval": "lexical"}
+                for idx, score in zip(ids, scores) if 0 <= idx < len(self.chunks)]
+
+    def _fuse(self, distances, ids, lexical_ids, k):
+        """Reciprocal rank fusion of a dense ranking (FAISS row) and lexical chunk ids."""
+        fused = {}
+        for rank, (dist, idx) in enumerate((float(d), int(i)) for d, i in zip(distances, ids) if i >= 0):
+            fused[idx] = [1.0 / (RRF_K + rank + 1), dist]
+        for rank, idx in enumerate(int(i) for i in lexical_ids):
+            entry = fused.setdefault(idx, [0.0, None])
+            entry[0] += 1.0 / (RRF_K + rank + 1)
+        top = sorted(fused.items(), key=lambda item: -item[1][0])[:k]
+        return [{"chunk": self.chunks[idx], "metadata": self.metadata[idx], "distance": dist,
+                 "score": score, "retrieval": "hybrid"}
+                for idx, (score, dist) in top if idx < len(self.chunks)]
+
+    def _results(self, distances, ids):
         results = []
-        for dist, idx in zip(D[0], I[0]):
+        for dist, idx in zip(distances, ids):
             if 0 <= idx < len(self.chunks):
                 results.append({
                     "chunk": self.chunks[idx],
@@ -34,3 +611,14 @@ class RagIndex:
                     "distance": float(dist)
                 })
         return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Convert a legacy pickle index to the native layout")
+    ap.add_argument("pickle", help="Legacy index pickle, e.g. adgm_index_data.pkl")
+    ap.add_argument("out_dir", help="Output directory, e.g. adgm_index")
+    args = ap.parse_args()
+    convert_pickle(args.pickle, args.out_dir)
+    print(f"Wrote native index to {args.out_dir}")
@@ -0,0 +1,613 @@
+# review.py
+# Review pipeline behind the Gradio app: checklist verification, red-flag
+# detection, RAG citations and the annotated .docx. Kept free of UI imports so
+# worker processes can load it on their own.
+
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from checklist_data import CHECKLISTS
+from process_detection import detect_process_type
+from detectors import DEFAULT_ENGINE, run_rules
+from rag_index import LEXICAL_MIN_COVERAGE, RagIndex
+from docx_utils import EXTRACTOR_VERSION, ReviewDocument, annotate_and_save, detect_headings
+from citation_cache import CitationCache
+from review_cache import ReviewCache, review_key
+from incremental import LineageStore, carry_forward, fingerprint, match_paragraphs
+from metrics import METRICS, collect, replay, span
+from embedding_service import EmbeddingService
+from doc_classifier import checklist_version, document_sample, load_or_build
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+CITATION_CACHE_PATH = "citation_cache.sqlite"
+# Worker processes for multi-file uploads; 1 keeps everything in-process
+REVIEW_WORKERS = int(os.environ.get("REVIEW_WORKERS", "1"))
+# Whole-file review cache; REVIEW_CACHE_MAX_MB=0 turns it off
+REVIEW_CACHE_PATH = os.environ.get("REVIEW_CACHE_PATH", "review_cache.sqlite")
+REVIEW_CACHE_MAX_MB = float(os.environ.get("REVIEW_CACHE_MAX_MB", "512"))
+# Incremental re-review: keep per-paragraph state of the last review of each
+# document lineage (file name by default) and redo only changed paragraphs
+REVIEW_INCREMENTAL = os.environ.get("REVIEW_INCREMENTAL", "1") == "1"
+REVIEW_LINEAGE_PATH = os.environ.get("REVIEW_LINEAGE_PATH", "review_lineage.sqlite")
+CHECKLIST_VERSION = checklist_version(CHECKLISTS)
+# Uploads are matched to checklist documents by content once prototypes exist
+# (built next to the index); below this cosine similarity, or less than the
+# margin ahead of the runner-up label, a file is unmatched
+CLASSIFY_MIN_SCORE = float(os.environ.get("CLASSIFY_MIN_SCORE", "0.3"))
+CLASSIFY_MIN_MARGIN = float(os.environ.get("CLASSIFY_MIN_MARGIN", "0.05"))
+CITATION_ERROR_PREFIX = "Citation lookup failed"
+# "hybrid" answers clauses that quote a regulation from the BM25 index without
+# embedding them and fuses lexical and dense rankings for the rest; "dense"
+# embeds every clause. Indexes built without BM25 files are always dense.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+LEXICAL_MIN_COVERAGE = float(os.environ.get("LEXICAL_MIN_COVERAGE", LEXICAL_MIN_COVERAGE))
+
+RAG = RagIndex()
+EMBED_MODEL = None
+CITATION_CACHE = None
+PROTOTYPES = None
+# Set once warmup() has loaded (or given up on) the index and model; citation
+# lookups wait on it, so reviews submitted during startup queue instead of failing
+READY = threading.Event()
+_WARMUP_LOCK = threading.Lock()
+_WARMUP_STARTED = False
+_MODEL_LOCK = threading.Lock()
+LINEAGES = LineageStore(REVIEW_LINEAGE_PATH) if REVIEW_INCREMENTAL else None
+REVIEW_CACHE = ReviewCache(REVIEW_CACHE_PATH, int(REVIEW_CACHE_MAX_MB * 1024 * 1024)) if REVIEW_CACHE_MAX_MB > 0 else None
+
+def index_path():
+    """The index to serve: the native directory, else the legacy pickle, else None."""
+    for path in ("adgm_index", "adgm_index_data.pkl"):
+        if os.path.exists(path):
+            return path
+    return None
+
+def citation_version():
+    """Index version plus the retrieval settings: everything a citation depends on."""
+    retrieval = "dense" if RAG.lexical is None else f"{RETRIEVAL_MODE}@{LEXICAL_MIN_COVERAGE}"
+    return f"{RAG.version}:{retrieval}"
+
+def load_index():
+    """Load the RAG index (native directory preferred over the pickle) and its citation cache."""
+    global CITATION_CACHE
+    path = index_path()
+    if path is None:
+        print("No RAG index found — citations will be 'Pending'.")
+        return
+    try:
+        if os.path.isdir(path):
+            RAG.load(path)
+        else:
+            RAG.load_from_pickle(path)
+        CITATION_CACHE = CitationCache(CITATION_CACHE_PATH, EMBED_MODEL_NAME, citation_version())
+    except Exception as e:
+        print("Failed to load index:", e)
+
+def load_prototypes():
+    """Checklist prototypes stored with the index; built and saved there on first use."""
+    global PROTOTYPES
+    try:
+        PROTOTYPES = load_or_build(index_path(), lambda texts: ensure_embed_model().encode(texts, convert_to_numpy=True),
+                                   CHECKLISTS, EMBED_MODEL_NAME)
+    except Exception as e:
+        print("Document classifier unavailable:", e)
+
+def ensure_embed_model():
+    global EMBED_MODEL
+    with _MODEL_LOCK:
+        if EMBED_MODEL is None:
+            # Imported here: torch alone costs seconds and only citations need it
+            from sentence_transformers import SentenceTransformer
+            EMBED_MODEL = SentenceTransformer(EMBED_MODEL_NAME)
+    return EMBED_MODEL
+
+def warmup():
+    """Load the index and, when there is one, the embedding model; then set READY."""
+    try:
+        load_index()
+        if RAG.index is not None:
+            ensure_embed_model()
+            load_prototypes()
+    except Exception as e:
+        print("Warmup failed:", e)
+    finally:
+        READY.set()
+
+def start_warmup():
+    """Run warmup() once, on a background thread."""
+    global _WARMUP_STARTED
+    with _WARMUP_LOCK:
+        if _WARMUP_STARTED:
+            return
+        _WARMUP_STARTED = True
+    threading.Thread(target=warmup, name="review-warmup", daemon=True).start()
+
+def wait_until_ready(timeout=None):
+    """Block until warmup has finished, starting it if nobody has yet."""
+    start_warmup()
+    return READY.wait(timeout)
+
+# Every session's encode calls go through one micro-batching worker instead of
+# contending for the shared model with one-row batches
+EMBEDDER = EmbeddingService(ensure_embed_model,
+                            max_batch_size=int(os.environ.get("EMBED_MAX_BATCH", "64")),
+                            max_wait_ms=float(os.environ.get("EMBED_MAX_WAIT_MS", "5")))
+
+def classify_documents(file_paths, process_type=None):
+    """
+    Match an upload to checklist documents by content: the first paragraphs
+    of every file are embedded in one batch and compared with the
+    prototypes in one matrix product. Returns (process, matches, content)
+    where matches[i] is (document name or None, score) for file i within
+    process (process_type when given, else the best match for the pack)
+    and content is the process the contents alone point to (None when not
+    clear-cut); or None when no prototypes are loaded.
+    """
+    if not file_paths:
+        return None
+    wait_until_ready()
+    if PROTOTYPES is None:
+        return None
+    with span("classify"):
+        vecs = EMBEDDER.encode([document_sample(p) for p in file_paths])
+        content, matches = PROTOTYPES.classify(vecs, CLASSIFY_MIN_SCORE, CLASSIFY_MIN_MARGIN)
+        process = content
+        if process_type in PROTOTYPES.processes:
+            process = process_type
+            matches = PROTOTYPES.match(PROTOTYPES.similarities(vecs), process, CLASSIFY_MIN_SCORE,
+                                       CLASSIFY_MIN_MARGIN)
+    return process, [(doc, score) for _, doc, score in matches], content
+
+def check_process_checklist(file_paths, selected_process):
+    """Return (checklist_summary, missing_docs_issue or None) for an upload."""
+    # Detect or use selected process type
+    process_type = None
+    if selected_process != "Auto Detect":
+        process_type = selected_process.lower().replace(" ", "_")
+    named_process = detect_process_type(file_paths)
+    try:
+        classified = classify_documents(file_paths, process_type or named_process)
+    except Exception as e:
+        print("Document classification failed:", e)
+        classified = None
+    if process_type is None:
+        # File names decide when they name a process; content only fills in when they do not
+        process_type = named_process or (classified and classified[0])
+    # Content counts towards the checklist only when it agrees with the process
+    content_agrees = bool(classified) and classified[2] == process_type
+
+    checklist_summary = {}
+    missing_issue = None
+    if process_type and process_type in CHECKLISTS:
+        required_docs = CHECKLISTS[process_type]
+        uploaded_names = [os.path.basename(p).lower() for p in file_paths]
+        covered = set()
+        if content_agrees:
+            # A file named after a requirement is that requirement, whatever its content scores
+            covered = {doc for name, (doc, _) in zip(uploaded_names, classified[1])
+                       if doc and not any(req.lower() in name for req in required_docs)}
+
+        # Find missing documents: matched by content, or named after the requirement
+        missing_docs = []
+        for req in required_docs:
+            if req not in covered and not any(req.lower() in name for name in uploaded_names):
+                missing_docs.append(req)
+
+        checklist_summary = {
+            "process": process_type.replace("_", " ").title(),
+            "documents_uploaded": len(file_paths),
+            "total_required": len(required_docs),
+            "uploaded_count": len(required_docs) - len(missing_docs),
+            "missing_count": len(missing_docs),
+            "missing_docs": missing_docs
+        }
+        if classified and classified[2] and not content_agrees:
+            checklist_summary["content_process"] = classified[2]
+        if content_agrees:
+            checklist_summary["classified"] = {
+                os.path.basename(p): {"document": doc, "score": round(score, 3)}
+                for p, (doc, score) in zip(file_paths, classified[1])
+            }
+
+        # Add missing doc warning to issues
+        if missing_docs:
+            missing_issue = {
+                "document": None,
+                "para_index": None,
+                "match_text": "",
+                "issue_text": f"Missing required documents for {process_type.replace('_', ' ').title()}",
+                "severity": "High",
+                "suggestion": f"Upload the missing documents: {', '.join(missing_docs)}",
+                "citation": "Checklist reference — ADGM requirements"
+            }
+    return checklist_summary, missing_issue
+
+def _noop_progress(file_path, stage):
+    pass
+
+def lineage_version():
+    # Carried-forward findings and citations are only valid for the same rules, index and retrieval
+    return f"{DEFAULT_ENGINE.version}.{EXTRACTOR_VERSION}:{citation_version()}"
+
+def detect_issues(file_path, progress=_noop_progress, lineage_id=None):
+    """Parse a file once and run the red-flag rules; returns (doc, issues, lineage).
+
+    With a lineage_id (and LINEAGES enabled), the paragraphs are diffed
+    against the last review of that lineage: only inserted or modified ones
+    are scanned and get new findings, while findings on unchanged paragraphs
+    are carried forward with their citations. lineage is then the state to
+    hand to remember_lineage once the issues are cited; otherwise None.
+    """
+    # The same ReviewDocument feeds the detectors (header and footer
+    # paragraphs included, after the body) and the annotation writer
+    with span("parse"):
+        doc = ReviewDocument(file_path)
+    progress(file_path, "parsed")
+    incremental = lineage_id is not None and LINEAGES is not None
+    if incremental:
+        # lineage_version() includes the index version and retrieval settings
+        wait_until_ready()
+    with span("detect"):
+        # Body paragraphs only, as detect_document_type reads them, without reopening the file
+        doc_type = detect_headings(doc.texts[:doc.body_count])
+        lineage = None
+        if not incremental:
+            issues = run_rules(doc.texts)
+        else:
+            issues, lineage = _detect_incremental(doc, lineage_id)
+    progress(file_path, "detected")
+    for iss in issues:
+        iss["document"] = os.path.basename(file_path)
+        iss["document_type"] = doc_type
+        pi = iss.get("para_index")
+        if isinstance(pi, int) and 0 <= pi < len(doc.locations):
+            iss["location"] = doc.locations[pi]
+    return doc, issues, lineage
+
+def _detect_incremental(doc, lineage_id):
+    version = lineage_version()
+    fps = [fingerprint(t) for t in doc.texts]
+    hits = [None] * len(fps)
+    carried = []
+    previous = LINEAGES.get(lineage_id, version)
+    if previous is not None:
+        old_fps, old_hits, old_issues = previous
+        mapping = match_paragraphs(old_fps, fps)
+        for new, old in mapping.items():
+            hits[new] = old_hits[old]
+        paragraph_rules = {r["id"] for r in DEFAULT_ENGINE.rules if r.get("scope", "paragraph") == "paragraph"}
+        carried = carry_forward(old_issues, mapping, doc.texts, paragraph_rules)
+    changed = [i for i, h in enumerate(hits) if h is None]
+    fresh = DEFAULT_ENGINE.run(doc.texts, hits=hits, only=changed)
+
+    # Same order a full run produces: grouped by rule, then by paragraph
+    rule_pos = {r["id"]: n for n, r in enumerate(DEFAULT_ENGINE.rules)}
+    issues = sorted(carried + fresh, key=lambda iss: (rule_pos.get(iss.get("rule"), len(rule_pos)), iss["para_index"]))
+    lineage = {"id": lineage_id, "version": version, "fingerprints": fps, "hits": hits,
+               "paragraphs": len(fps), "reevaluated": len(changed), "carried_forward": len(carried)}
+    return issues, lineage
+
+def remember_lineage(lineage, issues):
+    """Store a finished, cited review as the new baseline of its lineage."""
+    if lineage is not None and LINEAGES is not None:
+        with span("lineage_store"):
+            LINEAGES.put(lineage["id"], lineage["version"], lineage["fingerprints"], lineage["hits"], issues)
+
+def _lineage_stats(lineage):
+    keys = ("paragraphs", "reevaluated", "carried_forward")
+    return {k: lineage[k] for k in keys} if lineage else None
+
+def reviewed_path(file_path):
+    return f"{os.path.splitext(file_path)[0]}_reviewed.docx"
+
+def _counters():
+    """Retrieval and citation cache counters; pool workers send theirs back like timings."""
+    return {"retrieval": RAG.retrieval_counters(),
+            "citation_cache": CITATION_CACHE.counters() if CITATION_CACHE is not None else {}}
+
+def _counters_since(before):
+    after = _counters()
+    return {"retrieval": {path: [v - w for v, w in zip(after["retrieval"][path], before["retrieval"][path])]
+                          for path in after["retrieval"]},
+            "citation_cache": {key: n - before["citation_cache"].get(key, 0)
+                               for key, n in after["citation_cache"].items()}}
+
+def _merge_counters(counters):
+    """Add a worker's _counters_since() to this process's RAG and CITATION_CACHE counters."""
+    if not counters:
+        return
+    RAG.merge_retrieval(counters["retrieval"])
+    if CITATION_CACHE is not None:
+        CITATION_CACHE.merge(counters["citation_cache"])
+
+def review_file(file_path, lineage_id=None, annotate=True):
+    """Full per-file review (parse, detect, cite, annotate); runs in pool workers.
+    Returns (issues, incremental stats or None, stage timings, counter deltas)."""
+    before = _counters()
+    with collect() as timings:
+        doc, issues, lineage = detect_issues(file_path, lineage_id=lineage_id)
+        add_citations(issues)
+        if annotate:
+            with span("annotate"):
+                annotate_and_save(doc, issues, reviewed_path(file_path))
+        remember_lineage(lineage, issues)
+    return issues, _lineage_stats(lineage), timings.as_dict(), _counters_since(before)
+
+def review_cache_key(file_path):
+    """Content hash of the upload plus everything else its review depends on."""
+    return review_key(file_path, f"{DEFAULT_ENGINE.version}.{EXTRACTOR_VERSION}", CHECKLIST_VERSION,
+                      citation_version())
+
+def _cached_review(file_path, key, annotate=True):
+    """Serve a file from REVIEW_CACHE: writes its reviewed .docx (if annotate) and returns the issues, or None."""
+    hit = REVIEW_CACHE.get(key)
+    if hit is None:
+        return None
+    issues, docx_bytes = hit
+    if annotate:
+        with open(reviewed_path(file_path), "wb") as f:
+            f.write(docx_bytes)
+    # Same bytes may come back under another file name
+    for iss in issues:
+        iss["document"] = os.path.basename(file_path)
+    return issues
+
+def _store_review(file_path, key, issues):
+    # A transient citation failure should not be served back from the cache
+    if any((iss.get("citation") or "").startswith(CITATION_ERROR_PREFIX) for iss in issues):
+        return
+    with span("review_cache"), open(reviewed_path(file_path), "rb") as f:
+        REVIEW_CACHE.put(key, issues, f.read())
+
+def process_docs(files, selected_process, workers=None, progress=None, stats=None,
+                 incremental=None, lineage_ids=None, annotate=True, on_result=None):
+    """Review an upload. With workers > 1 and several files, per-file work is
+    spread over a process pool; results keep the original file order.
+    progress(file_path, stage) is called as each file is parsed, detected,
+    cited and annotated; pool workers and cache hits only report the final
+    'annotated'. Files reviewed before with the same rules, checklists and
+    index come from REVIEW_CACHE. With incremental (REVIEW_INCREMENTAL by
+    default), the rest are re-reviewed paragraph by paragraph against the
+    last version of their lineage: lineage_ids[i], or the file's base name.
+    If stats is a dict, per-run counters and the time spent in each stage
+    ('timings') are added to it for build_report. With annotate=False no
+    reviewed .docx is written (and nothing new enters REVIEW_CACHE, which
+    keeps one per entry). on_result(file_path, issues) is called as each
+    file's review completes.
+    """
+    with collect() as timings:
+        with span("total"):
+            result = _process_docs(files, selected_process, workers, progress, stats,
+                                   incremental, lineage_ids, annotate, on_result)
+    if stats is not None:
+        stats["timings"] = timings.as_dict()
+    return result
+
+def _process_docs(files, selected_process, workers, progress, stats, incremental, lineage_ids,
+                  annotate, on_result):
+    all_issues = []
+    file_paths = [file.name if hasattr(file, "name") else file for file in files]
+    workers = REVIEW_WORKERS if workers is None else workers
+    progress = progress or _noop_progress
+    incremental = REVIEW_INCREMENTAL if incremental is None else incremental
+    if incremental and LINEAGES is not None:
+        lineage_ids = lineage_ids or [os.path.basename(p) for p in file_paths]
+    else:
+        lineage_ids = [None] * len(file_paths)
+    lineage_stats = []
+
+    checklist_summary, missing_issue = check_process_checklist(file_paths, selected_process)
+    if missing_issue:
+        all_issues.append(missing_issue)
+
+    results = [None] * len(file_paths)
+    keys = [None] * len(file_paths)
+    if REVIEW_CACHE is not None:
+        # The index version is part of the key
+        wait_until_ready()
+        for i, p in enumerate(file_paths):
+            with span("review_cache"):
+                keys[i] = review_cache_key(p)
+                results[i] = _cached_review(p, keys[i], annotate)
+            if results[i] is not None:
+                progress(p, "annotated")
+                if on_result is not None:
+                    on_result(p, results[i])
+    todo = [i for i, r in enumerate(results) if r is None]
+    if stats is not None and REVIEW_CACHE is not None:
+        stats["review_cache"] = {"hits": len(file_paths) - len(todo), "misses": len(todo)}
+
+    def finish(i, issues, incremental_stats, worker_timings=None, worker_counters=None):
+        results[i] = issues
+        replay(worker_timings)
+        _merge_counters(worker_counters)
+        if incremental_stats:
+            lineage_stats.append(incremental_stats)
+        if REVIEW_CACHE is not None and annotate:
+            _store_review(file_paths[i], keys[i], issues)
+        progress(file_paths[i], "annotated")
+        if on_result is not None:
+            on_result(file_paths[i], issues)
+
+    if workers > 1 and len(todo) > 1:
+        with review_pool(workers) as pool:
+            futures = {pool.submit(review_file, file_paths[i], lineage_ids[i], annotate): i for i in todo}
+            # Worker counters are merged into this process's index and citation cache
+            wait_until_ready()
+            for fut in as_completed(futures):
+                finish(futures[fut], *fut.result())
+    else:
+        # Run red flag checks for each doc
+        per_file = [(i,) + detect_issues(file_paths[i], progress, lineage_ids[i]) for i in todo]
+
+        # Add citations via RAG, one batched lookup for every issue in the run
+        add_citations([iss for _, _, issues, _ in per_file for iss in issues])
+        for i, _, _, _ in per_file:
+            progress(file_paths[i], "cited")
+
+        for i, doc, issues, lineage in per_file:
+            # Save annotated docx
+            if annotate:
+                with span("annotate"):
+                    annotate_and_save(doc, issues, reviewed_path(file_paths[i]))
+            remember_lineage(lineage, issues)
+            finish(i, issues, _lineage_stats(lineage))
+
+    if stats is not None and lineage_stats:
+        stats["incremental"] = {k: sum(s[k] for s in lineage_stats) for k in lineage_stats[0]}
+    for issues in results:
+        all_issues.extend(issues)
+    return checklist_summary, all_issues
+
+def _init_review_worker():
+    # Load the index and model once per worker, before it takes any files
+    wait_until_ready()
+
+# The shared pool and how many process_docs calls are using each live pool;
+# JobQueue may run several reviews at once
+_POOL_LOCK = threading.Lock()
+_REVIEW_POOL = None
+_REVIEW_POOL_SIZE = 0
+_POOL_USERS = {}
+
+@contextmanager
+def review_pool(workers):
+    """
+    Process pool shared across requests, so workers initialize only once.
+    Asking for another size replaces the shared pool for later callers; a
+    replaced pool is shut down once the last review using it is done.
+    """
+    global _REVIEW_POOL, _REVIEW_POOL_SIZE
+    retired = None
+    with _POOL_LOCK:
+        if _REVIEW_POOL is None or _REVIEW_POOL_SIZE != workers:
+            if _REVIEW_POOL is not None and not _POOL_USERS[_REVIEW_POOL]:
+                retired = _REVIEW_POOL
+                del _POOL_USERS[retired]
+            # spawn: forking a process that already runs torch / Gradio threads is unsafe
+            _REVIEW_POOL = ProcessPoolExecutor(max_workers=workers,
+                                               mp_context=multiprocessing.get_context("spawn"),
+                                               initializer=_init_review_worker)
+            _REVIEW_POOL_SIZE = workers
+            _POOL_USERS[_REVIEW_POOL] = 0
+        pool = _REVIEW_POOL
+        _POOL_USERS[pool] += 1
+    if retired is not None:
+        retired.shutdown()
+    try:
+        yield pool
+    finally:
+        with _POOL_LOCK:
+            _POOL_USERS[pool] -= 1
+            idle = pool is not _REVIEW_POOL and not _POOL_USERS[pool]
+            if idle:
+                del _POOL_USERS[pool]
+        if idle:
+            pool.shutdown()
+
+def format_citation(results):
+    top = results[0]
+    retrieval = top.get("retrieval", "dense")
+    if retrieval == "lexical":
+        score = f"bm25={top['score']:.2f}"
+    elif retrieval == "hybrid":
+        # Reciprocal rank fusion score; not comparable with a distance or BM25
+        score = f"rrf={top['score']:.4f}"
+    else:
+        score = f"dist={top['distance']:.3f}"
+    return (
+        f"Source: {top['metadata']['url']} | "
+        f"Excerpt: {top['chunk'][:300]} ({score})"
+    )
+
+def _encode(texts):
+    with span("embed"):
+        return EMBEDDER.encode(texts)
+
+def add_citations(issues, k=2):
+    """
+    Fill in 'citation' for every issue that has none: cached clauses first,
+    then one RAG.query_texts call whose single encode covers only the clauses
+    the lexical fast path could not answer (stage "retrieve" includes "embed").
+    """
+    wait_until_ready()
+    pending = []
+    for iss in issues:
+        if iss.get("citation"):
+            # Checklist findings, or carried forward from an earlier review
+            continue
+        if iss.get("match_text", "") and RAG.index is not None:
+            pending.append(iss)
+        else:
+            iss["citation"] = "Pending — no local index loaded"
+    if not pending:
+        return
+
+    # Identical clauses (boilerplate repeated across files) are encoded once,
+    # and clauses seen in earlier runs come straight from the citation cache
+    texts = list(dict.fromkeys(iss["match_text"] for iss in pending))
+    by_text = {}
+    misses = texts
+    if CITATION_CACHE is not None:
+        misses = []
+        with span("citation_cache"):
+            for text in texts:
+                cached = CITATION_CACHE.get(text, k)
+                if cached is None:
+                    misses.append(text)
+                else:
+                    by_text[text] = cached[1]
+
+    error = None
+    if misses:
+        try:
+            with span("retrieve"):
+                batch_results, vecs = RAG.query_texts(misses, _encode, k=k, mode=RETRIEVAL_MODE,
+                                                      min_coverage=LEXICAL_MIN_COVERAGE)
+        except Exception as e:
+            error = f"{CITATION_ERROR_PREFIX}: {e}"
+        else:
+            by_text.update(zip(misses, batch_results))
+            fast = sum(1 for v in vecs if v is None)
+            METRICS.inc("citation_lexical_total", fast, help="Citations answered by the BM25 fast path.")
+            METRICS.inc("citation_dense_total", len(vecs) - fast, help="Citations that needed an embedding.")
+            if CITATION_CACHE is not None:
+                # Lexical answers have no embedding to keep
+                empty = np.zeros(0, dtype="float32")
+                with span("citation_cache"):
+                    CITATION_CACHE.put_many(((t, empty if v is None else v, r)
+                                             for t, v, r in zip(misses, vecs, batch_results)), k)
+
+    for iss in pending:
+        results = by_text.get(iss["match_text"])
+        if results is None:
+            iss["citation"] = error
+        elif results:
+            iss["citation"] = format_citation(results)
+
+def citation_cache_stats():
+    return CITATION_CACHE.stats() if CITATION_CACHE else None
+
+def retrieval_stats():
+    if not RAG.loaded:
+        return None
+    return dict(RAG.retrieval_stats(), mode="dense" if RAG.lexical is None else RETRIEVAL_MODE)
+
+def build_report(checklist, issues, stats=None):
+    """JSON report returned to the UI for a finished review; stats as filled in by process_docs."""
+    stats = stats or {}
+    review_cache = None
+    if REVIEW_CACHE is not None:
+        review_cache = dict(stats.get("review_cache", {}), total=REVIEW_CACHE.stats())
+    return {"process": checklist.get("process"),
+            "documents_uploaded": checklist.get("documents_uploaded"),
+            "issues_found": issues,
+            "review_cache": review_cache,
+            "incremental": stats.get("incremental"),
+            "timings": stats.get("timings"),
+            "citation_cache": citation_cache_stats(),
+            "retrieval": retrieval_stats(),
+            "embedding_service": EMBEDDER.stats()}
@@ -0,0 +1,99 @@
+# review_cache.py
+# Content-addressed cache of whole-file reviews: the issue list and the
+# reviewed .docx, keyed by the SHA-256 of the uploaded bytes plus the rule-set,
+# checklist and RAG index versions. Stored in SQLite and evicted least recently
+# used first once the total size passes max_bytes.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+READ_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def review_key(path, rules_version, checklist_version, index_version):
+    return f"{file_digest(path)}:{rules_version}:{checklist_version}:{index_version}"
+
+
+class ReviewCache:
+    """(issues, reviewed .docx bytes) per review_key, capped at max_bytes on disk."""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "key TEXT PRIMARY KEY, issues TEXT, docx BLOB, size INTEGER, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS reviews_last_used ON reviews (last_used)")
+        self._db.commit()
+
+    def get(self, key):
+        """Return (issues, docx_bytes) or None; a hit refreshes the entry's LRU position."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT issues, docx FROM reviews WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE reviews SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0]), bytes(row[1])
+
+    def put(self, key, issues, docx_bytes):
+        issues_json = json.dumps(issues)
+        size = len(issues_json) + len(docx_bytes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?)",
+                (key, issues_json, docx_bytes, size, time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM reviews").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM reviews ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM reviews WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews"
+            ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,38 @@
+# rules_data.py
+# Declarative red-flag rules compiled by detectors.RuleEngine.
+#
+# Each rule is a dict:
+#   id          unique name, reported on each issue as 'rule'
+#   scope       'paragraph' (default): evaluated for every paragraph
+#               'document': evaluated once over the whole document; the
+#               issue is anchored on the last paragraph
+#   any         keywords, at least one must appear (case-insensitive substring)
+#   all         keywords that must all appear together
+#   none        keywords that suppress the rule when any of them appears
+#   regex       patterns, a match counts like an 'any' keyword
+#   issue_text, severity, suggestion   copied onto the issue
+#
+# A paragraph-scope rule needs at least one of any / all / regex. A
+# document-scope rule with none of them fires whenever no 'none' keyword
+# appears anywhere in the document.
+
+JURISDICTION_KEYWORDS = ['abu dhabi global market', 'adgm', 'adgm courts']
+
+RULES = [
+    {
+        'id': 'jurisdiction_not_adgm',
+        'any': ['jurisdiction', 'court'],
+        'none': JURISDICTION_KEYWORDS,
+        'issue_text': 'Jurisdiction clause does not specify ADGM.',
+        'severity': 'High',
+        'suggestion': 'Update jurisdiction clause to specify Abu Dhabi Global Market (ADGM) courts.',
+    },
+    {
+        'id': 'missing_signatory',
+        'scope': 'document',
+        'none': ['signature', 'signed', 'signatory'],
+        'issue_text': 'Document appears to lack a signatory block or signature lines.',
+        'severity': 'High',
+        'suggestion': 'Add signatory panel with printed name, title, date and signature.',
+    },
+]
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# review.py opens its caches at import; keep them out of the working tree
+_CACHE_DIR = tempfile.mkdtemp(prefix="review-tests-")
+os.environ.setdefault("REVIEW_CACHE_PATH", os.path.join(_CACHE_DIR, "review_cache.sqlite"))
+os.environ.setdefault("REVIEW_LINEAGE_PATH", os.path.join(_CACHE_DIR, "review_lineage.sqlite"))
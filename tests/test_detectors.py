@@ -0,0 +1,25 @@
+from detectors import RuleEngine
+
+
+def test_regex_and_keyword_at_same_offset():
+    engine = RuleEngine([
+        {"id": "court", "any": ["court"], "issue_text": "court"},
+        {"id": "appeal", "regex": [r"court\s+of\s+appeal"], "issue_text": "appeal"},
+    ])
+    assert engine.scan("the court of appeal") == {"court", r"court\s+of\s+appeal"}
+    assert {iss["rule"] for iss in engine.run(["The Court of Appeal shall decide."])} == {"court", "appeal"}
+
+
+def test_regex_next_to_keyword_with_lookahead():
+    engine = RuleEngine([
+        {"id": "governed", "any": ["governed"]},
+        {"id": "not_adgm", "regex": [r"governed by the laws of (?!adgm)"]},
+    ])
+    assert {iss["rule"] for iss in engine.run(["This Agreement is governed by the laws of England."])} == {
+        "governed", "not_adgm"}
+    assert {iss["rule"] for iss in engine.run(["This Agreement is governed by the laws of ADGM."])} == {"governed"}
+
+
+def test_shorter_keyword_implied_by_longer():
+    engine = RuleEngine([{"id": "a", "any": ["jurisdiction"]}, {"id": "b", "any": ["exclusive jurisdiction"]}])
+    assert engine.scan("exclusive jurisdiction") == {"jurisdiction", "exclusive jurisdiction"}
@@ -0,0 +1,115 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+from docx import Document
+
+import review
+from checklist_data import CHECKLISTS
+from doc_classifier import Prototypes
+
+STOPWORDS = {"a", "an", "and", "for", "if", "in", "of", "on", "the", "to"}
+
+
+def encode(texts, dim=1024):
+    """Bag-of-words stand-in for the sentence encoder: deterministic, and
+    similar exactly when texts share words."""
+    out = np.zeros((len(texts), dim), dtype="float32")
+    for row, text in enumerate(texts):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            if word not in STOPWORDS:
+                out[row, zlib.crc32(word.encode()) % dim] += 1.0
+    return out
+
+
+# (process, checklist document, opening text of such a file)
+LABELLED = [
+    ("company_incorporation", "Articles of association",
+     "Articles of Association of Falcon Holdings Limited, adopted by special resolution"),
+    ("company_incorporation", "Register of members and directors",
+     "Register of members and register of directors kept at the registered office"),
+    ("company_incorporation", "Incorporation fee receipt",
+     "Receipt: incorporation fee paid to the Registration Authority"),
+    ("licensing", "Proof of premises lease",
+     "Lease agreement for office premises at Al Maryah Island, proof of tenancy"),
+    ("licensing", "Trade name reservation certificate",
+     "Certificate confirming reservation of the trade name Falcon Advisory"),
+    ("nda", "Non-disclosure agreement",
+     "This Non-Disclosure Agreement is made between the disclosing party and the receiving party"),
+    ("nda", "Signature page", "Signature page: signed for and on behalf of each party"),
+]
+
+
+@pytest.fixture
+def protos():
+    return Prototypes.build(encode, CHECKLISTS, "bag-of-words")
+
+
+@pytest.mark.parametrize("process, doc, text", LABELLED)
+def test_labelled_samples_match_their_document(protos, process, doc, text):
+    [(_, name, score)] = protos.match(protos.similarities(encode([text])), process)
+    assert name == doc and score >= 0.3
+
+
+def test_pack_is_classified_by_its_documents(protos):
+    texts = [text for process, _, text in LABELLED if process == "company_incorporation"]
+    process, matches = protos.classify(encode(texts))
+    assert process == "company_incorporation"
+    assert [name for _, name, _ in matches] == [doc for p, doc, _ in LABELLED if p == "company_incorporation"]
+
+
+def test_near_tie_between_documents_is_unlabelled(protos):
+    # Scores well against both "Application form" and "Business plan"
+    [(_, name, score)] = protos.match(protos.similarities(encode(["Business plan and application form"])),
+                                      "company_incorporation")
+    assert name is None and score >= 0.3
+
+
+def test_pack_shared_by_two_processes_has_no_process(protos):
+    # "Business plan" is on both the incorporation and the licensing checklist
+    process, _ = protos.classify(encode(["Business plan for the first three years"]))
+    assert process is None
+
+
+def make_docx(path, text):
+    doc = Document()
+    doc.add_paragraph(text)
+    doc.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def classifier(monkeypatch, protos):
+    class Embedder:
+        def encode(self, texts):
+            return encode(texts)
+
+    monkeypatch.setattr(review, "PROTOTYPES", protos)
+    monkeypatch.setattr(review, "EMBEDDER", Embedder())
+    monkeypatch.setattr(review, "wait_until_ready", lambda timeout=None: True)
+
+
+def test_file_names_outrank_a_conflicting_content_label(tmp_path, classifier):
+    # Named like an incorporation pack, but reads like licensing documents
+    files = [make_docx(tmp_path / "articles_draft.docx", LABELLED[3][2]),
+             make_docx(tmp_path / "scan_002.docx", LABELLED[4][2])]
+    summary, missing = review.check_process_checklist(files, "Auto Detect")
+    assert summary["process"] == "Company Incorporation"
+    assert summary["content_process"] == "licensing"
+    assert "classified" not in summary
+    # Only the file names count: nothing is covered
+    assert summary["missing_docs"] == CHECKLISTS["company_incorporation"]
+    assert missing is not None
+
+
+def test_content_covers_unnamed_files_when_it_agrees(tmp_path, classifier):
+    files = [make_docx(tmp_path / "articles of association.docx", LABELLED[0][2]),
+             make_docx(tmp_path / "scan_002.docx", LABELLED[1][2]),
+             # Named after a requirement, so its content label is not used
+             make_docx(tmp_path / "business plan.docx", LABELLED[2][2])]
+    summary, _ = review.check_process_checklist(files, "Auto Detect")
+    assert summary["process"] == "Company Incorporation"
+    assert "content_process" not in summary
+    assert set(CHECKLISTS["company_incorporation"]) - set(summary["missing_docs"]) == {
+        "Articles of association", "Register of members and directors", "Business plan"}
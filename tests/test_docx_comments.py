@@ -0,0 +1,145 @@
+import io
+import struct
+import zipfile
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from lxml import etree
+
+from docx_comments import add_comments_to_docx
+from docx_utils import ReviewDocument
+
+REWRITTEN = ("word/document.xml", "word/comments.xml", "word/_rels/document.xml.rels", "[Content_Types].xml")
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def raw_member(path, info):
+    """(local header extra field, compressed bytes) of one member."""
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(zipfile.sizeFileHeader)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        f.seek(name_len, 1)
+        extra = f.read(extra_len)
+        return extra, f.read(info.compress_size)
+
+
+def extra_ids(extra):
+    ids, i = [], 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack("<HH", extra[i:i + 4])
+        ids.append(tag)
+        i += 4 + size
+    return ids
+
+
+def rewrite_package(src, dst, stream=False):
+    """Copy a package member by member at compression level 1, unlike the
+    default level a recompressed copy would use. stream=True writes to a
+    non-seekable file, so every member gets a data descriptor."""
+    class Unseekable(io.RawIOBase):
+        def __init__(self, f):
+            self.f = f
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            return self.f.write(b)
+
+    with zipfile.ZipFile(src) as zin, open(dst, "wb") as f:
+        with zipfile.ZipFile(Unseekable(f) if stream else f, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                zout.writestr(info, zin.read(info), compresslevel=1)
+
+
+def test_round_trip_keeps_package_valid(tmp_path):
+    plain, src, dst = (str(tmp_path / n) for n in ("plain.docx", "a.docx", "a_commented.docx"))
+    doc = Document()
+    doc.add_paragraph("Articles of Association")
+    doc.add_paragraph("The registered office is in Dubai.")
+    doc.save(plain)
+    rewrite_package(plain, src)
+
+    add_comments_to_docx(src, dst, [
+        {"para_text_match": "registered office", "author": "Reviewer", "text": "Must be in ADGM"},
+        {"para_index": 0, "author": "Reviewer", "text": "Title check"},
+    ])
+
+    with zipfile.ZipFile(src) as zsrc, zipfile.ZipFile(dst) as zdst:
+        assert zdst.testzip() is None
+        for info in zsrc.infolist():
+            if info.filename not in REWRITTEN:
+                out = zdst.getinfo(info.filename)
+                assert (out.compress_type, out.date_time, out.CRC) == (info.compress_type, info.date_time, info.CRC)
+                assert raw_member(dst, out) == raw_member(src, info)
+        comments = zdst.read("word/comments.xml").decode("utf-8")
+    assert "Must be in ADGM" in comments and "Title check" in comments
+
+    reopened = Document(dst)
+    assert [p.text for p in reopened.paragraphs] == ["Articles of Association", "The registered office is in Dubai."]
+    assert reopened.part.part_related_by(
+        "http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments") is not None
+
+
+def test_para_index_matches_review_document(tmp_path):
+    src, dst = str(tmp_path / "a.docx"), str(tmp_path / "a_commented.docx")
+    doc = Document()
+    doc.add_paragraph("Intro")
+    inserted = doc.add_paragraph()
+    # Text only inside a tracked insertion, which ReviewDocument does not count
+    inserted._p.append(parse_xml(
+        f'<w:ins {nsdecls("w")} w:id="1" w:author="A" w:date="2024-01-01T00:00:00Z">'
+        '<w:r><w:t>Inserted clause</w:t></w:r></w:ins>'))
+    doc.add_paragraph("The courts of Dubai shall have jurisdiction.")
+    doc.save(src)
+    assert ReviewDocument(src).texts == ["Intro", "The courts of Dubai shall have jurisdiction."]
+
+    add_comments_to_docx(src, dst, [{"para_index": 1, "author": "Reviewer", "text": "Use ADGM courts"}])
+
+    body = etree.fromstring(zipfile.ZipFile(dst).read("word/document.xml")).find(W + "body")
+    anchored = [p for p in body.iter(W + "p") if p.find(W + "commentRangeStart") is not None]
+    assert len(anchored) == 1
+    assert "".join(t.text for t in anchored[0].iter(W + "t")) == "The courts of Dubai shall have jurisdiction."
+
+
+def test_data_descriptor_members_are_copied_raw(tmp_path):
+    plain, src, dst = (str(tmp_path / n) for n in ("plain.docx", "a.docx", "b.docx"))
+    Document().save(plain)
+    rewrite_package(plain, src, stream=True)
+    with zipfile.ZipFile(src) as zsrc:
+        assert all(info.flag_bits & 0x08 for info in zsrc.infolist())
+
+    add_comments_to_docx(src, dst, [{"para_index": 0, "author": "Reviewer", "text": "Empty"}])
+
+    with zipfile.ZipFile(src) as zsrc, zipfile.ZipFile(dst) as zdst:
+        assert zdst.testzip() is None
+        for info in zsrc.infolist():
+            if info.filename not in REWRITTEN:
+                out = zdst.getinfo(info.filename)
+                assert not out.flag_bits & 0x08
+                assert raw_member(dst, out)[1] == raw_member(src, info)[1]
+    Document(dst)
+
+
+def test_zip64_members_keep_one_zip64_record(tmp_path, monkeypatch):
+    plain, src, dst = (str(tmp_path / n) for n in ("plain.docx", "a.docx", "b.docx"))
+    Document().save(plain)
+    # Members over the limit need zip64 records in both headers
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    rewrite_package(plain, src)
+    with zipfile.ZipFile(src) as zsrc:
+        large = [i for i in zsrc.infolist() if i.filename not in REWRITTEN and i.file_size > 1000]
+        assert large and all(0x0001 in extra_ids(i.extra) for i in large)
+
+    add_comments_to_docx(src, dst, [{"para_index": 0, "author": "Reviewer", "text": "Empty"}])
+
+    with zipfile.ZipFile(dst) as zdst:
+        assert zdst.testzip() is None
+        for info in large:
+            out = zdst.getinfo(info.filename)
+            extra, data = raw_member(dst, out)
+            assert extra_ids(extra).count(0x0001) == 1
+            assert extra_ids(out.extra).count(0x0001) == 1
+            assert data == raw_member(src, info)[1]
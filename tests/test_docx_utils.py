@@ -0,0 +1,35 @@
+from docx import Document
+
+from detectors import run_rules
+from docx_utils import ReviewDocument, annotate_and_save, extract_paragraphs
+
+
+def make_doc(path):
+    doc = Document()
+    doc.add_paragraph("Articles of Association")
+    doc.add_paragraph("1. The Company shall maintain a register of members.")
+    doc.sections[0].header.paragraphs[0].text = (
+        "This Agreement shall be governed by the laws of Dubai and the courts of Dubai shall have exclusive jurisdiction.")
+    doc.sections[0].footer.paragraphs[0].text = "Signature: ____________ Name: Omar Haddad"
+    doc.save(path)
+
+
+def test_headers_and_footers_follow_the_body(tmp_path):
+    path = str(tmp_path / "a.docx")
+    make_doc(path)
+    doc = ReviewDocument(path)
+    assert doc.locations == ["body", "body", "header1", "footer1"]
+    assert doc.body_count == 2
+    assert [p.text for p in doc.paragraphs] == doc.texts[:2]
+    assert extract_paragraphs(path) == doc.texts
+
+
+def test_header_issue_is_detected_and_annotated(tmp_path):
+    path, out = str(tmp_path / "a.docx"), str(tmp_path / "a_reviewed.docx")
+    make_doc(path)
+    doc = ReviewDocument(path)
+    issues = run_rules(doc.texts)
+    assert [(iss["rule"], iss["para_index"]) for iss in issues] == [("jurisdiction_not_adgm", 2)]
+    annotate_and_save(doc, issues, out)
+    texts = [p.text for p in Document(out).paragraphs]
+    assert any(t.startswith("[ISSUE #1] (in header1)") for t in texts)
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+import review
+from detectors import run_rules
+from incremental import LineageStore, carry_forward, fingerprint, match_paragraphs
+
+V1 = [
+    "Articles of Association",
+    "Disputes shall be referred to the courts of Dubai.",
+    "The register of members is kept at the registered office.",
+    "Jurisdiction: the onshore courts of Abu Dhabi.",
+    "Signed by the directors.",
+]
+
+
+def fps(texts):
+    return [fingerprint(t) for t in texts]
+
+
+def test_match_paragraphs_maps_unchanged_paragraphs():
+    inserted = V1[:2] + ["Recitals"] + V1[2:]
+    assert match_paragraphs(fps(V1), fps(inserted)) == {0: 0, 1: 1, 3: 2, 4: 3, 5: 4}
+    modified = V1[:1] + ["Disputes shall be referred to the ADGM Courts."] + V1[2:]
+    assert match_paragraphs(fps(V1), fps(modified)) == {0: 0, 2: 2, 3: 3, 4: 4}
+    deleted = V1[:1] + V1[2:]
+    assert match_paragraphs(fps(V1), fps(deleted)) == {0: 0, 1: 2, 2: 3, 3: 4}
+
+
+def test_carry_forward_moves_issues_and_keeps_index_citations():
+    texts = ["Recitals"] + V1
+    old = [{"rule": "jurisdiction_not_adgm", "para_index": 1, "citation": "Source: a"},
+           {"rule": "jurisdiction_not_adgm", "para_index": 3, "citation": "Citation lookup failed: timeout"},
+           {"rule": "missing_signatory", "para_index": 4, "citation": "Source: b"}]
+    carried = carry_forward(old, match_paragraphs(fps(V1), fps(texts)), texts, {"jurisdiction_not_adgm"})
+    assert carried == [
+        {"rule": "jurisdiction_not_adgm", "para_index": 2, "match_text": texts[2], "citation": "Source: a"},
+        # Failed lookups are cleared so they are retried
+        {"rule": "jurisdiction_not_adgm", "para_index": 4, "match_text": texts[4], "citation": ""},
+    ]
+
+
+@pytest.fixture
+def lineages(monkeypatch, tmp_path):
+    monkeypatch.setattr(review, "LINEAGES", LineageStore(str(tmp_path / "lineage.sqlite")))
+
+
+def review_version(texts, label):
+    """One incremental review of lineage "a"; new findings are cited with the label."""
+    issues, lineage = review._detect_incremental(SimpleNamespace(texts=texts), "a")
+    for iss in issues:
+        iss["citation"] = iss.get("citation") or f"Source: {label}"
+    review.remember_lineage(lineage, issues)
+    return issues, lineage
+
+
+def summary(issues):
+    return [(iss["rule"], iss["para_index"], iss["citation"]) for iss in issues]
+
+
+def full_run(texts):
+    return [(iss["rule"], iss["para_index"]) for iss in run_rules(texts)]
+
+
+@pytest.mark.parametrize("edit, expected, reevaluated", [
+    # Insert before both findings: both move down and keep their citations
+    (lambda t: ["Recitals"] + t, [("jurisdiction_not_adgm", 2, "Source: v1"),
+                                  ("jurisdiction_not_adgm", 4, "Source: v1")], 1),
+    # Modify the first finding's paragraph: re-detected and re-cited
+    (lambda t: t[:1] + ["Disputes go to the courts of Dubai, UAE."] + t[2:],
+     [("jurisdiction_not_adgm", 1, "Source: v2"), ("jurisdiction_not_adgm", 3, "Source: v1")], 1),
+    # Delete the first finding's paragraph: the other moves up
+    (lambda t: t[:1] + t[2:], [("jurisdiction_not_adgm", 2, "Source: v1")], 0),
+])
+def test_incremental_review_matches_a_full_run(lineages, edit, expected, reevaluated):
+    first, lineage = review_version(V1, "v1")
+    assert lineage["reevaluated"] == len(V1)
+    assert summary(first) == [("jurisdiction_not_adgm", 1, "Source: v1"), ("jurisdiction_not_adgm", 3, "Source: v1")]
+
+    texts = edit(V1)
+    second, lineage = review_version(texts, "v2")
+    assert summary(second) == expected
+    assert [(rule, i) for rule, i, _ in expected] == full_run(texts)
+    assert lineage["reevaluated"] == reevaluated
+    assert lineage["carried_forward"] == sum(c == "Source: v1" for _, _, c in expected)
+    assert all(iss["match_text"] == texts[iss["para_index"]] for iss in second)
@@ -0,0 +1,71 @@
+import threading
+
+import review
+
+
+class FakePool:
+    created = []
+
+    def __init__(self, max_workers, **kwargs):
+        self.max_workers = max_workers
+        self.shut_down = False
+        FakePool.created.append(self)
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+def reset_pool(monkeypatch):
+    FakePool.created = []
+    monkeypatch.setattr(review, "ProcessPoolExecutor", FakePool)
+    monkeypatch.setattr(review, "_REVIEW_POOL", None)
+    monkeypatch.setattr(review, "_REVIEW_POOL_SIZE", 0)
+    monkeypatch.setattr(review, "_POOL_USERS", {})
+
+
+def test_concurrent_reviews_share_one_pool(monkeypatch):
+    reset_pool(monkeypatch)
+    # Both jobs hold the pool at once
+    both_inside = threading.Barrier(2)
+    pools = []
+
+    def job():
+        with review.review_pool(2) as pool:
+            pools.append(pool)
+            both_inside.wait(timeout=5)
+
+    threads = [threading.Thread(target=job) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(FakePool.created) == 1 and pools[0] is pools[1]
+    assert not pools[0].shut_down
+
+
+def test_resized_pool_is_shut_down_once_idle(monkeypatch):
+    reset_pool(monkeypatch)
+    with review.review_pool(2) as first:
+        with review.review_pool(3) as second:
+            assert second is not first
+            assert not first.shut_down
+        assert not second.shut_down
+        assert not first.shut_down
+    assert first.shut_down
+    with review.review_pool(3) as again:
+        assert again is second
+    # An idle pool is replaced straight away
+    with review.review_pool(4):
+        assert second.shut_down
+
+
+def test_retrieval_settings_are_part_of_the_cache_keys(monkeypatch, tmp_path):
+    path = tmp_path / "a.docx"
+    path.write_bytes(b"same bytes")
+    monkeypatch.setattr(review.RAG, "lexical", object())
+    keys = set()
+    for mode, coverage in (("hybrid", 0.8), ("dense", 0.8), ("hybrid", 0.9)):
+        monkeypatch.setattr(review, "RETRIEVAL_MODE", mode)
+        monkeypatch.setattr(review, "LEXICAL_MIN_COVERAGE", coverage)
+        keys.add((review.review_cache_key(str(path)), review.lineage_version()))
+    assert len({k for k, _ in keys}) == 3 and len({v for _, v in keys}) == 3
@@ -0,0 +1,53 @@
+import itertools
+
+import pytest
+
+import review_cache
+from review_cache import ReviewCache
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    # Distinct, increasing timestamps so the LRU order does not depend on clock resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr(review_cache.time, "time", lambda: float(next(clock)))
+    return ReviewCache(str(tmp_path / "reviews.sqlite"), max_bytes=300)
+
+
+def put(cache, key, size):
+    # "[]" for the issues plus the docx bytes
+    cache.put(key, [], b"x" * (size - 2))
+
+
+def keys(cache):
+    return [k for k in "abcdefg" if cache.get(k) is not None]
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    for key in "abc":
+        put(cache, key, 100)
+    assert cache.get("a") is not None  # a is now more recent than b and c
+    put(cache, "d", 100)
+    assert cache.stats()["bytes"] == 300 and cache.evictions == 1
+    assert cache.get("b") is None
+
+    # Needs 150 bytes: the two least recently used go (c, then a)
+    put(cache, "e", 150)
+    assert cache.evictions == 3
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 250)
+    assert keys(cache) == ["d", "e"]
+
+
+def test_size_accounting_on_replace_and_reopen(cache, tmp_path):
+    put(cache, "a", 100)
+    put(cache, "a", 250)  # replaces, not adds
+    put(cache, "b", 50)
+    assert (cache.stats()["entries"], cache.stats()["bytes"], cache.evictions) == (2, 300, 0)
+
+    put(cache, "c", 301)  # larger than the whole cache: not stored, nothing evicted
+    assert cache.get("c") is None and cache.stats()["bytes"] == 300
+
+    reopened = ReviewCache(cache.path, max_bytes=300)
+    assert reopened.stats()["bytes"] == 300
+    assert reopened.get("a") == ([], b"x" * 248)